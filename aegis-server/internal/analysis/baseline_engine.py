@@ -19,6 +19,9 @@ import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Rows fetched per round trip when streaming history through a cursor
+BASELINE_FETCH_SIZE = 10000
+
 
 class BaselineLearner:
     """
@@ -95,48 +98,53 @@ class BaselineLearner:
         """
         logger.info(f"Analyzing process patterns for device {device_id}")
         
-        # Get all process snapshots in time range
-        async with self.pool.acquire() as conn:
-            processes = await conn.fetch(
-                """
-                SELECT name, cpu_percent, memory_percent, collected_at
-                FROM processes
-                WHERE agent_id = $1 AND collected_at >= $2 AND collected_at <= $3
-                ORDER BY collected_at
-                """,
-                device_id, start_time, end_time
-            )
-        
-        if not processes:
-            logger.warning(f"No process data found for device {device_id}")
-            return {}
-        
         # Group by snapshot timestamp to count processes per snapshot
         snapshots = {}
         process_names = {}
         cpu_values = []
         memory_values = []
+        cpu_intensive_procs = {}
         
-        for proc in processes:
-            snapshot_time = proc['collected_at'].replace(second=0, microsecond=0)
-            
-            if snapshot_time not in snapshots:
-                snapshots[snapshot_time] = []
-            
-            snapshots[snapshot_time].append(proc)
-            
-            # Track process names
-            if proc['name']:
-                process_names[proc['name']] = process_names.get(proc['name'], 0) + 1
-            
-            # Collect CPU and memory values
-            if proc['cpu_percent'] is not None:
-                cpu_values.append(proc['cpu_percent'])
-            if proc['memory_percent'] is not None:
-                memory_values.append(proc['memory_percent'])
+        # Stream the process snapshots in the time range through a
+        # server-side cursor, aggregating as rows arrive, so weeks of
+        # snapshots are never held in memory at once
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                async for proc in conn.cursor(
+                    """
+                    SELECT name, cpu_percent, memory_percent, collected_at
+                    FROM processes
+                    WHERE agent_id = $1 AND collected_at >= $2 AND collected_at <= $3
+                    ORDER BY collected_at
+                    """,
+                    device_id, start_time, end_time,
+                    prefetch=BASELINE_FETCH_SIZE
+                ):
+                    snapshot_time = proc['collected_at'].replace(second=0, microsecond=0)
+                    snapshots[snapshot_time] = snapshots.get(snapshot_time, 0) + 1
+                    
+                    # Track process names
+                    if proc['name']:
+                        process_names[proc['name']] = process_names.get(proc['name'], 0) + 1
+                    
+                    # Collect CPU and memory values
+                    if proc['cpu_percent'] is not None:
+                        cpu_values.append(proc['cpu_percent'])
+                    if proc['memory_percent'] is not None:
+                        memory_values.append(proc['memory_percent'])
+                    
+                    # Track CPU-intensive processes (CPU > 10%)
+                    if proc['name'] and proc['cpu_percent'] and proc['cpu_percent'] > 10:
+                        if proc['name'] not in cpu_intensive_procs:
+                            cpu_intensive_procs[proc['name']] = []
+                        cpu_intensive_procs[proc['name']].append(proc['cpu_percent'])
+        
+        if not snapshots:
+            logger.warning(f"No process data found for device {device_id}")
+            return {}
         
         # Calculate process count statistics
-        process_counts = [len(snapshot) for snapshot in snapshots.values()]
+        process_counts = list(snapshots.values())
         
         # Find most common processes (appearing in >80% of snapshots)
         total_snapshots = len(snapshots)
@@ -146,14 +154,6 @@ class BaselineLearner:
             if count > common_threshold
         ]
         
-        # Find CPU-intensive processes (mean CPU > 10%)
-        cpu_intensive_procs = {}
-        for proc in processes:
-            if proc['name'] and proc['cpu_percent'] and proc['cpu_percent'] > 10:
-                if proc['name'] not in cpu_intensive_procs:
-                    cpu_intensive_procs[proc['name']] = []
-                cpu_intensive_procs[proc['name']].append(proc['cpu_percent'])
-        
         typical_cpu_intensive = [
             name for name, values in cpu_intensive_procs.items()
             if np.mean(values) > 10
@@ -241,7 +241,7 @@ class BaselineLearner:
         
         for m in metrics:
             try:
-                # Parse JSON strings (JSONB columns are returned as strings by asyncpg)
+                # JSONB columns are decoded by the pool codec; tolerate text for ad-hoc connections
                 import json
                 cpu_data = json.loads(m['cpu_data']) if isinstance(m['cpu_data'], str) else m['cpu_data']
                 memory_data = json.loads(m['memory_data']) if isinstance(m['memory_data'], str) else m['memory_data']
@@ -18,6 +18,10 @@ config = RULES_CONFIG
 ANALYSIS_INTERVAL_SECONDS = config.analysis_interval_seconds
 # How far back to look for logs each time
 LOOKBACK_MINUTES = config.lookback_minutes
+# Rows buffered per round-trip when streaming rule results through a cursor
+CURSOR_PREFETCH = 500
+# Maximum number of distinct sample messages attached to an alert
+SAMPLE_MESSAGE_LIMIT = 5
 
 async def run_analysis_loop():
     """
@@ -70,7 +74,6 @@ async def check_potential_brute_force(conn: asyncpg.Connection):
         SELECT
             raw_data->>'_HOSTNAME' AS hostname,
             SUBSTRING(raw_data->>'MESSAGE' FROM 'from ([0-9.]+) port') AS source_ip,
-            raw_data->>'MESSAGE' AS message,
             timestamp
         FROM logs
         WHERE
@@ -87,8 +90,7 @@ async def check_potential_brute_force(conn: asyncpg.Connection):
         d.agent_id,
         COUNT(*) AS failure_count,
         MIN(fl.timestamp) AS first_attempt,
-        MAX(fl.timestamp) AS last_attempt,
-        array_agg(DISTINCT SUBSTRING(fl.message, 1, 100)) AS sample_messages
+        MAX(fl.timestamp) AS last_attempt
     FROM failed_logins fl
     LEFT JOIN devices d ON d.hostname = fl.hostname
     WHERE fl.source_ip IS NOT NULL
@@ -97,34 +99,37 @@ async def check_potential_brute_force(conn: asyncpg.Connection):
     """
 
     try:
-        suspicious_attempts = await conn.fetch(sql, start_time, rule_config.min_failures)
-
-        for record in suspicious_attempts:
-            hostname = record['hostname']
-            ip = record['source_ip']
-            agent_id = record['agent_id']
-            failures = record['failure_count']
-            first_attempt = record['first_attempt']
-            last_attempt = record['last_attempt']
-
-            print("\n" + "="*50)
-            print(f">>> SERVER ALERT: {rule_name}")
-            print(f">>> Device: {hostname} (agent_id: {agent_id})")
-            print(f">>> Source IP: {ip}")
-            print(f">>> Failed attempts: {failures}")
-            print(f">>> Time range: {first_attempt} to {last_attempt}")
-            print("="*50 + "\n")
-
-            # --- Save the Alert to the DB with agent_id ---
-            alert_details = {
-                "hostname": hostname,
-                "source_ip": ip,
-                "failed_attempts": failures,
-                "first_attempt": first_attempt.isoformat() if first_attempt else None,
-                "last_attempt": last_attempt.isoformat() if last_attempt else None,
-                "timeframe_minutes": rule_config.timeframe_minutes,
-            }
-            await save_alert(conn, rule_name, alert_details, rule_config.severity, agent_id)
+        # Stream grouped rows through a server-side cursor so memory stays
+        # bounded even when a burst of failures produces many groups
+        async with conn.transaction():
+            async for record in conn.cursor(
+                sql, start_time, rule_config.min_failures, prefetch=CURSOR_PREFETCH
+            ):
+                hostname = record['hostname']
+                ip = record['source_ip']
+                agent_id = record['agent_id']
+                failures = record['failure_count']
+                first_attempt = record['first_attempt']
+                last_attempt = record['last_attempt']
+
+                print("\n" + "="*50)
+                print(f">>> SERVER ALERT: {rule_name}")
+                print(f">>> Device: {hostname} (agent_id: {agent_id})")
+                print(f">>> Source IP: {ip}")
+                print(f">>> Failed attempts: {failures}")
+                print(f">>> Time range: {first_attempt} to {last_attempt}")
+                print("="*50 + "\n")
+
+                # --- Save the Alert to the DB with agent_id ---
+                alert_details = {
+                    "hostname": hostname,
+                    "source_ip": ip,
+                    "failed_attempts": failures,
+                    "first_attempt": first_attempt.isoformat() if first_attempt else None,
+                    "last_attempt": last_attempt.isoformat() if last_attempt else None,
+                    "timeframe_minutes": rule_config.timeframe_minutes,
+                }
+                await save_alert(conn, rule_name, alert_details, rule_config.severity, agent_id)
 
     except Exception as e:
         print(f"Error during brute force check: {e}")
@@ -170,34 +175,37 @@ async def check_distributed_brute_force(conn: asyncpg.Connection):
     """
 
     try:
-        attacks = await conn.fetch(
-            sql, start_time, rule_config.min_devices, rule_config.min_attempts
-        )
-
-        for record in attacks:
-            ip = record['source_ip']
-            device_count = record['affected_devices']
-            total_attempts = record['total_attempts']
-            hostnames = record['hostnames']
-
-            print("\n" + "="*50)
-            print(f">>> SERVER ALERT: {rule_name}")
-            print(f">>> Source IP: {ip}")
-            print(f">>> Targeted {device_count} devices with {total_attempts} attempts")
-            print(f">>> Affected hosts: {', '.join(hostnames)}")
-            print("="*50 + "\n")
-
-            alert_details = {
-                "source_ip": ip,
-                "affected_devices": device_count,
-                "total_attempts": total_attempts,
-                "hostnames": hostnames,
-                "first_attempt": record['first_attempt'].isoformat(),
-                "last_attempt": record['last_attempt'].isoformat(),
-                "timeframe_minutes": rule_config.timeframe_minutes,
-            }
-            # No specific agent_id since this spans multiple devices
-            await save_alert(conn, rule_name, alert_details, rule_config.severity, None)
+        async with conn.transaction():
+            async for record in conn.cursor(
+                sql,
+                start_time,
+                rule_config.min_devices,
+                rule_config.min_attempts,
+                prefetch=CURSOR_PREFETCH,
+            ):
+                ip = record['source_ip']
+                device_count = record['affected_devices']
+                total_attempts = record['total_attempts']
+                hostnames = record['hostnames']
+
+                print("\n" + "="*50)
+                print(f">>> SERVER ALERT: {rule_name}")
+                print(f">>> Source IP: {ip}")
+                print(f">>> Targeted {device_count} devices with {total_attempts} attempts")
+                print(f">>> Affected hosts: {', '.join(hostnames)}")
+                print("="*50 + "\n")
+
+                alert_details = {
+                    "source_ip": ip,
+                    "affected_devices": device_count,
+                    "total_attempts": total_attempts,
+                    "hostnames": hostnames,
+                    "first_attempt": record['first_attempt'].isoformat(),
+                    "last_attempt": record['last_attempt'].isoformat(),
+                    "timeframe_minutes": rule_config.timeframe_minutes,
+                }
+                # No specific agent_id since this spans multiple devices
+                await save_alert(conn, rule_name, alert_details, rule_config.severity, None)
 
     except Exception as e:
         print(f"Error during distributed brute force check: {e}")
@@ -234,43 +242,60 @@ async def check_privilege_escalation(conn: asyncpg.Connection):
                 OR
                 raw_data->>'MESSAGE' ILIKE '%unauthorized%'
             )
+    ),
+    distinct_messages AS (
+        -- Dedup messages with a hash aggregate up front so the per-device
+        -- sample below is a cheap slice instead of a DISTINCT sort
+        SELECT
+            hostname,
+            SUBSTRING(message, 1, 100) AS short_message,
+            COUNT(*) AS attempt_count,
+            MIN(timestamp) AS first_attempt,
+            MAX(timestamp) AS last_attempt
+        FROM escalation_attempts
+        GROUP BY hostname, SUBSTRING(message, 1, 100)
     )
     SELECT
-        ea.hostname,
+        dm.hostname,
         d.agent_id,
-        COUNT(*) AS attempt_count,
-        array_agg(DISTINCT SUBSTRING(ea.message, 1, 100)) AS sample_messages,
-        MIN(ea.timestamp) AS first_attempt,
-        MAX(ea.timestamp) AS last_attempt
-    FROM escalation_attempts ea
-    LEFT JOIN devices d ON d.hostname = ea.hostname
-    GROUP BY ea.hostname, d.agent_id
-    HAVING COUNT(*) >= $2;
+        SUM(dm.attempt_count)::bigint AS attempt_count,
+        (array_agg(dm.short_message))[1:$3] AS sample_messages,
+        MIN(dm.first_attempt) AS first_attempt,
+        MAX(dm.last_attempt) AS last_attempt
+    FROM distinct_messages dm
+    LEFT JOIN devices d ON d.hostname = dm.hostname
+    GROUP BY dm.hostname, d.agent_id
+    HAVING SUM(dm.attempt_count) >= $2;
     """
 
     try:
-        attempts = await conn.fetch(sql, start_time, rule_config.min_attempts)
-
-        for record in attempts:
-            hostname = record['hostname']
-            agent_id = record['agent_id']
-            count = record['attempt_count']
-
-            print("\n" + "="*50)
-            print(f">>> SERVER ALERT: {rule_name}")
-            print(f">>> Device: {hostname}")
-            print(f">>> Attempts: {count}")
-            print("="*50 + "\n")
-
-            alert_details = {
-                "hostname": hostname,
-                "attempt_count": count,
-                "sample_messages": record['sample_messages'],
-                "first_attempt": record['first_attempt'].isoformat(),
-                "last_attempt": record['last_attempt'].isoformat(),
-                "timeframe_minutes": rule_config.timeframe_minutes,
-            }
-            await save_alert(conn, rule_name, alert_details, rule_config.severity, agent_id)
+        async with conn.transaction():
+            async for record in conn.cursor(
+                sql,
+                start_time,
+                rule_config.min_attempts,
+                SAMPLE_MESSAGE_LIMIT,
+                prefetch=CURSOR_PREFETCH,
+            ):
+                hostname = record['hostname']
+                agent_id = record['agent_id']
+                count = record['attempt_count']
+
+                print("\n" + "="*50)
+                print(f">>> SERVER ALERT: {rule_name}")
+                print(f">>> Device: {hostname}")
+                print(f">>> Attempts: {count}")
+                print("="*50 + "\n")
+
+                alert_details = {
+                    "hostname": hostname,
+                    "attempt_count": count,
+                    "sample_messages": record['sample_messages'],
+                    "first_attempt": record['first_attempt'].isoformat(),
+                    "last_attempt": record['last_attempt'].isoformat(),
+                    "timeframe_minutes": rule_config.timeframe_minutes,
+                }
+                await save_alert(conn, rule_name, alert_details, rule_config.severity, agent_id)
 
     except Exception as e:
         print(f"Error during privilege escalation check: {e}")
@@ -322,31 +347,35 @@ async def check_port_scan_activity(conn: asyncpg.Connection):
     """
 
     try:
-        scans = await conn.fetch(sql, start_time, rule_config.min_unique_ports)
-
-        for record in scans:
-            hostname = record['hostname']
-            source_ip = record['source_ip']
-            agent_id = record['agent_id']
-            unique_ports = record['unique_ports']
-
-            print("\n" + "="*50)
-            print(f">>> SERVER ALERT: {rule_name}")
-            print(f">>> Device: {hostname}")
-            print(f">>> Source IP: {source_ip}")
-            print(f">>> Scanned {unique_ports} unique ports")
-            print("="*50 + "\n")
-
-            alert_details = {
-                "hostname": hostname,
-                "source_ip": source_ip,
-                "unique_ports": unique_ports,
-                "total_attempts": record['total_attempts'],
-                "first_attempt": record['first_attempt'].isoformat(),
-                "last_attempt": record['last_attempt'].isoformat(),
-                "timeframe_minutes": rule_config.timeframe_minutes,
-            }
-            await save_alert(conn, rule_name, alert_details, rule_config.severity, agent_id)
+        async with conn.transaction():
+            async for record in conn.cursor(
+                sql,
+                start_time,
+                rule_config.min_unique_ports,
+                prefetch=CURSOR_PREFETCH,
+            ):
+                hostname = record['hostname']
+                source_ip = record['source_ip']
+                agent_id = record['agent_id']
+                unique_ports = record['unique_ports']
+
+                print("\n" + "="*50)
+                print(f">>> SERVER ALERT: {rule_name}")
+                print(f">>> Device: {hostname}")
+                print(f">>> Source IP: {source_ip}")
+                print(f">>> Scanned {unique_ports} unique ports")
+                print("="*50 + "\n")
+
+                alert_details = {
+                    "hostname": hostname,
+                    "source_ip": source_ip,
+                    "unique_ports": unique_ports,
+                    "total_attempts": record['total_attempts'],
+                    "first_attempt": record['first_attempt'].isoformat(),
+                    "last_attempt": record['last_attempt'].isoformat(),
+                    "timeframe_minutes": rule_config.timeframe_minutes,
+                }
+                await save_alert(conn, rule_name, alert_details, rule_config.severity, agent_id)
 
     except Exception as e:
         print(f"Error during port scan check: {e}")
@@ -449,7 +478,11 @@ async def save_alert(
     RETURNING id, created_at
     """
     try:
-        result = await conn.fetchrow(sql, rule_name, json.dumps(details), severity, agent_id)
+        # Rules call this while a cursor's transaction is open; the savepoint
+        # keeps one failed insert from aborting it and rolling back the
+        # rule's other alerts
+        async with conn.transaction():
+            result = await conn.fetchrow(sql, rule_name, json.dumps(details), severity, agent_id)
 
         # --- Push notification via WebSocket ---
         # We need to notify ALL users who might be affected.
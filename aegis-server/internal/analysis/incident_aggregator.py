@@ -6,13 +6,110 @@ Groups related alerts into incidents for better threat visibility.
 """
 
 import asyncio
-import json
+import contextlib
+import re
 from datetime import UTC, datetime, timedelta
+from itertools import groupby
 
 import asyncpg
 
 from internal.storage.postgres import get_db_pool
 
+# Related attack patterns: rule_name -> rule family
+_RULE_FAMILY = {
+    'SSH Failed Login Attempts': 'brute_force',
+    'Distributed Brute Force Attack': 'brute_force',
+    'Agent: SSH Brute Force Detected': 'brute_force',
+    'Privilege Escalation Attempt': 'privilege_escalation',
+    'Coordinated Resource Spike': 'resource',
+    'Agent: Sustained High CPU Usage': 'resource',
+}
+
+# Severity ordinals for O(1) comparisons, and the reverse lookup
+_SEV_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+_SEV_NAME = ('low', 'medium', 'high', 'critical')
+_HIGH_RANK = _SEV_RANK['high']
+
+# Rule-name keywords -> attack vector, in priority order
+_VECTOR_MAP = {
+    'Brute Force': 'brute_force',
+    'Privilege Escalation': 'privilege_escalation',
+    'Port Scan': 'reconnaissance',
+    'Resource': 'resource_abuse',
+}
+_VECTOR_RE = re.compile('|'.join(re.escape(keyword) for keyword in _VECTOR_MAP))
+
+# Aggregation cadence (seconds): shorter while incidents keep forming,
+# backing off towards the cap while quiet. A new_alert notification wakes
+# the loop early, but never sooner than the minimum interval.
+MIN_AGGREGATION_INTERVAL = 10
+BASE_AGGREGATION_INTERVAL = 120
+MAX_AGGREGATION_INTERVAL = 300
+
+# Channel notified by the alerts insert trigger (see init_db)
+NEW_ALERT_CHANNEL = 'new_alert'
+
+# Ungrouped alerts with their correlation keys projected out of details
+UNGROUPED_ALERTS_SQL = """
+SELECT
+    id,
+    rule_name,
+    severity,
+    agent_id,
+    created_at,
+    details->>'source_ip' AS source_ip,
+    details->>'hostname' AS hostname,
+    floor(extract(epoch FROM created_at) / $2)::bigint AS bucket
+FROM alerts
+WHERE
+    incident_id IS NULL
+    AND created_at >= $1
+    AND (
+        agent_id IS NOT NULL
+        OR details ? 'source_ip'
+        OR details ? 'hostname'
+    )
+ORDER BY created_at DESC
+"""
+
+# Creates a batch of incidents and links their alerts in one statement
+CREATE_INCIDENTS_SQL = """
+WITH batch AS (
+    SELECT
+        nextval(pg_get_serial_sequence('incidents', 'id')) AS id,
+        b.*
+    FROM jsonb_to_recordset($1::jsonb) AS b(
+        name TEXT,
+        description TEXT,
+        severity TEXT,
+        alert_count INTEGER,
+        affected_devices TEXT[],
+        attack_vector TEXT,
+        metadata JSONB,
+        alert_ids BIGINT[]
+    )
+),
+ins AS (
+    INSERT INTO incidents
+    (id, name, description, severity, status, alert_count,
+     affected_devices, attack_vector, metadata)
+    SELECT
+        id, name, description, severity, 'open', alert_count,
+        affected_devices, attack_vector, metadata
+    FROM batch
+),
+linked AS (
+    UPDATE alerts
+    SET incident_id = m.incident_id
+    FROM (
+        SELECT id AS incident_id, unnest(alert_ids) AS alert_id
+        FROM batch
+    ) m
+    WHERE alerts.id = m.alert_id
+)
+SELECT count(*) FROM batch
+"""
+
 
 class IncidentAggregator:
     """
@@ -22,69 +119,83 @@ class IncidentAggregator:
     def __init__(self):
         self.aggregation_window = timedelta(minutes=30)  # Time window for grouping
         self.min_alerts_for_incident = 2  # Minimum alerts to create incident
+        self._last_group_count = 0  # Incidents created by the last cycle
+        self._idle_interval = BASE_AGGREGATION_INTERVAL
+
+    async def prepare(self, conn: asyncpg.Connection):
+        """
+        Prepare the aggregator's statements on a long-lived connection so
+        each cycle skips parse/plan.
+        """
+        self._ungrouped_stmt = await conn.prepare(UNGROUPED_ALERTS_SQL)
+        self._create_incidents_stmt = await conn.prepare(CREATE_INCIDENTS_SQL)
 
     async def aggregate_alerts(self):
         """
         Main aggregation loop - finds ungrouped alerts and creates incidents.
+        Requires prepare() to have been called on the current connection.
         """
-        pool = get_db_pool()
-        if not pool:
-            print("Incident aggregator: DB pool not ready")
-            return
-
+        self._last_group_count = 0
         try:
-            async with pool.acquire() as conn:
-                # Find ungrouped alerts from the last hour
-                ungrouped_alerts = await self._get_ungrouped_alerts(conn)
+            # Find ungrouped alerts from the last hour
+            ungrouped_alerts = await self._get_ungrouped_alerts()
 
-                if not ungrouped_alerts:
-                    return
+            if not ungrouped_alerts:
+                return
 
-                print(f"Found {len(ungrouped_alerts)} ungrouped alerts")
+            print(f"Found {len(ungrouped_alerts)} ungrouped alerts")
 
-                # Group alerts by correlation keys
-                alert_groups = self._correlate_alerts(ungrouped_alerts)
+            # Group alerts by correlation keys
+            alert_groups = self._correlate_alerts(ungrouped_alerts)
 
-                # Create incidents for significant groups
-                for group in alert_groups:
-                    if len(group) >= self.min_alerts_for_incident:
-                        await self._create_incident(conn, group)
+            # Create incidents for significant groups in one batch
+            incidents = [
+                self._build_incident(group)
+                for group in alert_groups
+                if len(group) >= self.min_alerts_for_incident
+            ]
+            if incidents:
+                await self._create_incidents(incidents)
+            self._last_group_count = len(incidents)
 
         except Exception as e:
             print(f"Error in incident aggregation: {e}")
 
-    async def _get_ungrouped_alerts(
-        self, conn: asyncpg.Connection
-    ) -> list[dict]:
+    def next_interval(self) -> float:
         """
-        Fetch alerts that haven't been grouped into incidents yet.
+        Seconds to wait before the next cycle.
+
+        While incidents are being created the interval shrinks with the
+        number of groups found; while quiet it doubles up to the cap.
         """
-        cutoff_time = datetime.now(UTC) - timedelta(hours=1)
+        if self._last_group_count:
+            self._idle_interval = BASE_AGGREGATION_INTERVAL
+            return max(
+                MIN_AGGREGATION_INTERVAL,
+                BASE_AGGREGATION_INTERVAL / (1 + self._last_group_count),
+            )
+
+        interval = self._idle_interval
+        self._idle_interval = min(MAX_AGGREGATION_INTERVAL, interval * 2)
+        return interval
 
-        sql = """
-        SELECT 
-            id, rule_name, severity, details, agent_id, created_at
-        FROM alerts
-        WHERE 
-            incident_id IS NULL
-            AND created_at >= $1
-        ORDER BY created_at DESC
+    async def _get_ungrouped_alerts(self) -> list[asyncpg.Record]:
         """
+        Fetch alerts that haven't been grouped into incidents yet.
 
-        rows = await conn.fetch(sql, cutoff_time)
+        Only the correlation keys are projected out of the details JSONB and
+        the aggregation-window bucket is computed server-side, so the full
+        alert payloads never cross the wire. Alerts without any correlation
+        key can never join a group and are skipped.
+        """
+        cutoff_time = datetime.now(UTC) - timedelta(hours=1)
 
-        alerts = []
-        for row in rows:
-            alert = dict(row)
-            # Parse details JSON
-            if isinstance(alert['details'], str):
-                try:
-                    alert['details'] = json.loads(alert['details'])
-                except json.JSONDecodeError:
-                    alert['details'] = {}
-            alerts.append(alert)
+        rows = await self._ungrouped_stmt.fetch(
+            cutoff_time, int(self.aggregation_window.total_seconds())
+        )
 
-        return alerts
+        # Records already support ['key'] and .get(), no need to copy to dicts
+        return rows
 
     def _correlate_alerts(self, alerts: list[dict]) -> list[list[dict]]:
         """
@@ -92,255 +203,191 @@ class IncidentAggregator:
 
         Correlation strategies:
         1. Same source IP attacking multiple devices
-        2. Same device experiencing multiple alert types
-        3. Similar attack patterns within time window
-        """
-        groups = []
-        processed_ids = set()
+        2. Same device experiencing multiple related alert types
+        3. Same hostname within the time window
 
-        for alert in alerts:
-            if alert['id'] in processed_ids:
-                continue
+        Each alert is keyed once and alerts sharing a key in the same or an
+        adjacent aggregation-window bucket are merged with a union-find, so
+        the cost is linear in the number of alerts instead of pairwise.
 
-            # Start a new group with this alert
-            group = [alert]
-            processed_ids.add(alert['id'])
+        Alerts arrive ordered by created_at DESC, so buckets are contiguous
+        and descending: only the current bucket's keys and the next-newer
+        bucket's keys need to be kept, and no datetime arithmetic is done.
+        """
+        parent = list(range(len(alerts)))
+        rank = [0] * len(alerts)
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i: int, j: int):
+            root_i, root_j = find(i), find(j)
+            if root_i == root_j:
+                return
+            if rank[root_i] < rank[root_j]:
+                root_i, root_j = root_j, root_i
+            parent[root_j] = root_i
+            if rank[root_i] == rank[root_j]:
+                rank[root_i] += 1
+
+        # correlation key -> index of the first alert seen, per bucket
+        newer_bucket = None
+        newer_keys: dict[tuple, int] = {}
+
+        for bucket, members in groupby(
+            enumerate(alerts), key=lambda item: item[1]['bucket']
+        ):
+            # Straddlers: also link against the adjacent (newer) bucket
+            adjacent = newer_keys if newer_bucket == bucket + 1 else {}
+            current: dict[tuple, int] = {}
+
+            for idx, alert in members:
+                for key in self._key_alert(alert):
+                    other = current.setdefault(key, idx)
+                    if other != idx:
+                        union(idx, other)
+                    other = adjacent.get(key)
+                    if other is not None:
+                        union(idx, other)
+
+            newer_bucket, newer_keys = bucket, current
+
+        groups: dict[int, list[dict]] = {}
+        for idx, alert in enumerate(alerts):
+            groups.setdefault(find(idx), []).append(alert)
+
+        return list(groups.values())
+
+    def _key_alert(self, alert: dict) -> tuple:
+        """
+        Derive the correlation keys for an alert.
+        """
+        keys = []
 
-            # Find related alerts
-            for other_alert in alerts:
-                if other_alert['id'] in processed_ids:
-                    continue
+        source_ip = alert.get('source_ip')
+        if source_ip:
+            keys.append(('ip', source_ip))
 
-                if self._are_related(alert, other_alert):
-                    group.append(other_alert)
-                    processed_ids.add(other_alert['id'])
+        hostname = alert.get('hostname')
+        if hostname:
+            keys.append(('host', hostname))
 
-            groups.append(group)
+        family = _RULE_FAMILY.get(alert['rule_name'])
+        if alert.get('agent_id') and family is not None:
+            keys.append(('agent_family', alert['agent_id'], family))
 
-        return groups
+        return tuple(keys)
 
-    def _are_related(self, alert1: dict, alert2: dict) -> bool:
+    def _build_incident(self, alert_group: list[dict]) -> dict:
         """
-        Determine if two alerts are related and should be grouped.
+        Build the incident row for a group of related alerts.
+
+        Every attribute is accumulated in a single pass over the group.
         """
-        # Check time proximity
-        time_diff = abs(
-            (alert1['created_at'] - alert2['created_at']).total_seconds()
+        max_rank = 0
+        high_count = 0
+        affected_devices = set()
+        hostnames = set()
+        rule_names = set()
+        source_ips = set()
+        start = end = alert_group[0]['created_at']
+
+        for alert in alert_group:
+            rank = _SEV_RANK.get(alert.get('severity'), 0)
+            if rank > max_rank:
+                max_rank = rank
+            if rank >= _HIGH_RANK:
+                high_count += 1
+
+            hostname = alert.get('hostname')
+            affected_devices.add(hostname or 'Unknown')
+            if hostname:
+                hostnames.add(hostname)
+
+            source_ip = alert.get('source_ip')
+            if source_ip:
+                source_ips.add(source_ip)
+
+            rule_names.add(alert['rule_name'])
+
+            created_at = alert['created_at']
+            if created_at < start:
+                start = created_at
+            elif created_at > end:
+                end = created_at
+
+        # Severity: escalate if multiple high-severity alerts
+        severity = _SEV_NAME[max_rank]
+        if high_count >= 3 and severity == 'high':
+            severity = 'critical'
+
+        # Name: source IP attacks, then device-specific, then multi-device
+        if source_ips:
+            name = f"Attack from {next(iter(source_ips))} - {len(alert_group)} alerts"
+        elif len(hostnames) == 1:
+            name = f"Security incident on {next(iter(hostnames))}"
+        elif len(hostnames) > 1:
+            name = f"Multi-device security incident ({len(hostnames)} devices)"
+        else:
+            name = f"Security incident - {len(alert_group)} alerts"
+
+        description = (
+            f"Correlated incident with {len(alert_group)} alerts: "
+            f"{', '.join(rule_names)}"
         )
-        if time_diff > self.aggregation_window.total_seconds():
-            return False
-
-        details1 = alert1.get('details', {})
-        details2 = alert2.get('details', {})
-
-        # Strategy 1: Same source IP
-        source_ip1 = details1.get('source_ip')
-        source_ip2 = details2.get('source_ip')
-        if source_ip1 and source_ip2 and source_ip1 == source_ip2:
-            return True
-
-        # Strategy 2: Same device
-        if alert1.get('agent_id') and alert2.get('agent_id'):
-            if alert1['agent_id'] == alert2['agent_id']:
-                # Same device, check if related attack types
-                if self._are_attack_types_related(
-                    alert1['rule_name'], alert2['rule_name']
-                ):
-                    return True
-
-        # Strategy 3: Same hostname
-        hostname1 = details1.get('hostname')
-        hostname2 = details2.get('hostname')
-        if hostname1 and hostname2 and hostname1 == hostname2:
-            return True
-
-        return False
-
-    def _are_attack_types_related(self, rule1: str, rule2: str) -> bool:
-        """
-        Check if two rule types are related attack patterns.
-        """
-        # Define rule families
-        brute_force_rules = [
-            'SSH Failed Login Attempts',
-            'Distributed Brute Force Attack',
-            'Agent: SSH Brute Force Detected',
-        ]
-        escalation_rules = ['Privilege Escalation Attempt']
-        resource_rules = [
-            'Coordinated Resource Spike',
-            'Agent: Sustained High CPU Usage',
-        ]
-
-        # Check if both rules are in the same family
-        for family in [brute_force_rules, escalation_rules, resource_rules]:
-            if rule1 in family and rule2 in family:
-                return True
-
-        return False
-
-    async def _create_incident(
-        self, conn: asyncpg.Connection, alert_group: list[dict]
-    ):
-        """
-        Create an incident from a group of related alerts.
-        """
-        if not alert_group:
-            return
-
-        # Determine incident attributes
-        severity = self._determine_incident_severity(alert_group)
-        name = self._generate_incident_name(alert_group)
-        description = self._generate_incident_description(alert_group)
-        affected_devices = list(
-            set(
-                alert.get('details', {}).get('hostname', 'Unknown')
-                for alert in alert_group
-            )
+
+        # Attack vector: highest-priority keyword found in the rule names
+        found = set(_VECTOR_RE.findall('\n'.join(rule_names)))
+        attack_vector = next(
+            (vector for keyword, vector in _VECTOR_MAP.items() if keyword in found),
+            'unknown',
         )
-        attack_vector = self._determine_attack_vector(alert_group)
 
-        # Build metadata
         metadata = {
-            'alert_types': list(set(alert['rule_name'] for alert in alert_group)),
+            'alert_types': list(rule_names),
             'time_range': {
-                'start': min(
-                    alert['created_at'] for alert in alert_group
-                ).isoformat(),
-                'end': max(
-                    alert['created_at'] for alert in alert_group
-                ).isoformat(),
+                'start': start.isoformat(),
+                'end': end.isoformat(),
             },
-            'source_ips': list(
-                set(
-                    alert.get('details', {}).get('source_ip')
-                    for alert in alert_group
-                    if alert.get('details', {}).get('source_ip')
-                )
-            ),
+            'source_ips': list(source_ips),
         }
 
-        try:
-            # Create incident
-            incident_sql = """
-            INSERT INTO incidents 
-            (name, description, severity, status, alert_count, affected_devices, 
-             attack_vector, metadata)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8::jsonb)
-            RETURNING id
-            """
-
-            incident_id = await conn.fetchval(
-                incident_sql,
-                name,
-                description,
-                severity,
-                'open',
-                len(alert_group),
-                affected_devices,
-                attack_vector,
-                json.dumps(metadata),
-            )
-
-            # Link alerts to incident
-            alert_ids = [alert['id'] for alert in alert_group]
-            update_sql = """
-            UPDATE alerts 
-            SET incident_id = $1
-            WHERE id = ANY($2)
-            """
-
-            await conn.execute(update_sql, incident_id, alert_ids)
-
-            print(f"\n{'='*50}")
-            print(f">>> INCIDENT CREATED: {name}")
-            print(f">>> Severity: {severity}")
-            print(f">>> Alerts: {len(alert_group)}")
-            print(f">>> Devices: {', '.join(affected_devices)}")
-            print(f"{'='*50}\n")
-
-        except Exception as e:
-            print(f"Error creating incident: {e}")
+        return {
+            'name': name,
+            'description': description,
+            'severity': severity,
+            'alert_count': len(alert_group),
+            'affected_devices': list(affected_devices),
+            'attack_vector': attack_vector,
+            'metadata': metadata,
+            'alert_ids': [alert['id'] for alert in alert_group],
+        }
 
-    def _determine_incident_severity(self, alerts: list[dict]) -> str:
-        """
-        Determine incident severity based on alerts.
+    async def _create_incidents(self, incidents: list[dict]):
         """
-        severity_order = ['low', 'medium', 'high', 'critical']
-        max_severity = 'low'
-
-        for alert in alerts:
-            alert_severity = alert.get('severity', 'low')
-            if severity_order.index(alert_severity) > severity_order.index(
-                max_severity
-            ):
-                max_severity = alert_severity
-
-        # Escalate if multiple high-severity alerts
-        high_count = sum(
-            1 for a in alerts if a.get('severity') in ['high', 'critical']
-        )
-        if high_count >= 3 and max_severity == 'high':
-            max_severity = 'critical'
-
-        return max_severity
+        Create incidents and link their alerts in a single round-trip.
 
-    def _generate_incident_name(self, alerts: list[dict]) -> str:
-        """
-        Generate a descriptive name for the incident.
+        The whole batch is shipped as one JSONB document, serialized by the
+        pool's orjson JSONB codec. Incident ids are drawn from the sequence
+        up front so each alert can be linked to its incident in the same
+        statement.
         """
-        # Check for source IP attacks
-        source_ips = set(
-            alert.get('details', {}).get('source_ip')
-            for alert in alerts
-            if alert.get('details', {}).get('source_ip')
-        )
-
-        if source_ips:
-            ip = list(source_ips)[0]
-            return f"Attack from {ip} - {len(alerts)} alerts"
-
-        # Check for device-specific incidents
-        devices = set(
-            alert.get('details', {}).get('hostname')
-            for alert in alerts
-            if alert.get('details', {}).get('hostname')
-        )
-
-        if len(devices) == 1:
-            device = list(devices)[0]
-            return f"Security incident on {device}"
-
-        # Multi-device incident
-        if len(devices) > 1:
-            return f"Multi-device security incident ({len(devices)} devices)"
+        try:
+            await self._create_incidents_stmt.fetchval(incidents)
 
-        # Fallback
-        return f"Security incident - {len(alerts)} alerts"
+            for incident in incidents:
+                print(f"\n{'='*50}")
+                print(f">>> INCIDENT CREATED: {incident['name']}")
+                print(f">>> Severity: {incident['severity']}")
+                print(f">>> Alerts: {incident['alert_count']}")
+                print(f">>> Devices: {', '.join(incident['affected_devices'])}")
+                print(f"{'='*50}\n")
 
-    def _generate_incident_description(self, alerts: list[dict]) -> str:
-        """
-        Generate incident description.
-        """
-        rule_types = set(alert['rule_name'] for alert in alerts)
-        return f"Correlated incident with {len(alerts)} alerts: {', '.join(rule_types)}"
-
-    def _determine_attack_vector(self, alerts: list[dict]) -> str:
-        """
-        Determine the primary attack vector.
-        """
-        rule_names = [alert['rule_name'] for alert in alerts]
-
-        if any('Brute Force' in rule for rule in rule_names):
-            return 'brute_force'
-        elif any('Privilege Escalation' in rule for rule in rule_names):
-            return 'privilege_escalation'
-        elif any('Port Scan' in rule for rule in rule_names):
-            return 'reconnaissance'
-        elif any('Resource' in rule for rule in rule_names):
-            return 'resource_abuse'
-        else:
-            return 'unknown'
+        except Exception as e:
+            print(f"Error creating incidents: {e}")
 
 
 async def run_incident_aggregation_loop():
@@ -351,10 +398,42 @@ async def run_incident_aggregation_loop():
     aggregator = IncidentAggregator()
 
     while True:
+        pool = get_db_pool()
+        if not pool:
+            print("Incident aggregator: DB pool not ready, waiting...")
+            await asyncio.sleep(10)
+            continue
+
         try:
-            await aggregator.aggregate_alerts()
+            # Hold one connection across cycles so the prepared statements
+            # stay warm; reacquire only if the connection is lost
+            async with pool.acquire() as conn:
+                await aggregator.prepare(conn)
+
+                # Wake early when new alerts are inserted
+                new_alert = asyncio.Event()
+
+                def on_new_alert(*_, event=new_alert):
+                    event.set()
+
+                await conn.add_listener(NEW_ALERT_CHANNEL, on_new_alert)
+                try:
+                    while not conn.is_closed():
+                        new_alert.clear()
+                        await aggregator.aggregate_alerts()
+
+                        # Debounce bursts, then wait for a notification or
+                        # the adaptive interval, whichever comes first
+                        interval = aggregator.next_interval()
+                        await asyncio.sleep(MIN_AGGREGATION_INTERVAL)
+                        with contextlib.suppress(TimeoutError):
+                            await asyncio.wait_for(
+                                new_alert.wait(),
+                                timeout=max(0, interval - MIN_AGGREGATION_INTERVAL),
+                            )
+                finally:
+                    if not conn.is_closed():
+                        await conn.remove_listener(NEW_ALERT_CHANNEL, on_new_alert)
         except Exception as e:
             print(f"Error in aggregation loop: {e}")
-
-        # Run every 2 minutes
-        await asyncio.sleep(120)
+            await asyncio.sleep(120)
@@ -5,11 +5,12 @@ Configuration for correlation rules.
 Allows easy tuning of detection thresholds and rule parameters.
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import cached_property
 from typing import Literal
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class RuleConfig:
     """Base configuration for correlation rules"""
 
@@ -17,7 +18,7 @@ class RuleConfig:
     severity: Literal["low", "medium", "high", "critical"] = "medium"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SSHBruteForceConfig(RuleConfig):
     """Configuration for SSH brute force detection"""
 
@@ -27,7 +28,7 @@ class SSHBruteForceConfig(RuleConfig):
     severity: Literal["low", "medium", "high", "critical"] = "high"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class DistributedBruteForceConfig(RuleConfig):
     """Configuration for distributed brute force detection"""
 
@@ -38,7 +39,7 @@ class DistributedBruteForceConfig(RuleConfig):
     severity: Literal["low", "medium", "high", "critical"] = "critical"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PrivilegeEscalationConfig(RuleConfig):
     """Configuration for privilege escalation detection"""
 
@@ -48,7 +49,7 @@ class PrivilegeEscalationConfig(RuleConfig):
     severity: Literal["low", "medium", "high", "critical"] = "high"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PortScanConfig(RuleConfig):
     """Configuration for port scan detection"""
 
@@ -58,7 +59,7 @@ class PortScanConfig(RuleConfig):
     severity: Literal["low", "medium", "high", "critical"] = "high"
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ResourceAnomalyConfig(RuleConfig):
     """Configuration for resource anomaly detection"""
 
@@ -71,27 +72,52 @@ class ResourceAnomalyConfig(RuleConfig):
     severity: Literal["low", "medium", "high", "critical"] = "medium"
 
 
+@dataclass(frozen=True)
 class CorrelationRulesConfig:
-    """Master configuration for all correlation rules"""
-
-    def __init__(self):
-        self.ssh_brute_force = SSHBruteForceConfig()
-        self.distributed_brute_force = DistributedBruteForceConfig()
-        self.privilege_escalation = PrivilegeEscalationConfig()
-        self.port_scan = PortScanConfig()
-        self.resource_anomaly = ResourceAnomalyConfig()
-
-        # Global settings
-        self.analysis_interval_seconds = 60
-        self.lookback_minutes = 5
+    """
+    Master configuration for all correlation rules. Frozen like the rule
+    configs, but not slotted: cached_property needs the instance __dict__.
+    """
+
+    ssh_brute_force: SSHBruteForceConfig = field(default_factory=SSHBruteForceConfig)
+    distributed_brute_force: DistributedBruteForceConfig = field(
+        default_factory=DistributedBruteForceConfig
+    )
+    privilege_escalation: PrivilegeEscalationConfig = field(
+        default_factory=PrivilegeEscalationConfig
+    )
+    port_scan: PortScanConfig = field(default_factory=PortScanConfig)
+    resource_anomaly: ResourceAnomalyConfig = field(
+        default_factory=ResourceAnomalyConfig
+    )
+
+    # Global settings
+    analysis_interval_seconds: int = 60
+    lookback_minutes: int = 5
+
+    @cached_property
+    def _all_rules(self) -> tuple[tuple[str, RuleConfig], ...]:
+        """Static (attribute name, config) pairs; avoids scanning __dict__"""
+        return (
+            ("ssh_brute_force", self.ssh_brute_force),
+            ("distributed_brute_force", self.distributed_brute_force),
+            ("privilege_escalation", self.privilege_escalation),
+            ("port_scan", self.port_scan),
+            ("resource_anomaly", self.resource_anomaly),
+        )
+
+    @cached_property
+    def enabled_rules(self) -> tuple[str, ...]:
+        """Names of enabled rules, computed once since rule configs are frozen"""
+        return tuple(
+            rule_name
+            for rule_name, rule_config in self._all_rules
+            if rule_config.enabled
+        )
 
     def get_enabled_rules(self) -> list[str]:
         """Returns list of enabled rule names"""
-        enabled = []
-        for rule_name, rule_config in self.__dict__.items():
-            if isinstance(rule_config, RuleConfig) and rule_config.enabled:
-                enabled.append(rule_name)
-        return enabled
+        return list(self.enabled_rules)
 
 
 # Global configuration instance
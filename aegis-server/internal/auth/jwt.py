@@ -1,10 +1,13 @@
 # aegis-server/internal/auth/jwt.py
 
+import time
 from datetime import UTC, datetime, timedelta
 
+import jwt
+from cachetools import TLRUCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
 
 from internal.config.config import settings
@@ -14,6 +17,31 @@ from models.models import TokenData
 # (This is our login endpoint)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# JWT parameters resolved once at import instead of on every token
+# (settings is None when config.toml is missing)
+_SECRET_KEY = settings.jwt.secret_key if settings else None
+_ALGORITHM = settings.jwt.algorithm if settings else None
+_ALGORITHMS = [_ALGORITHM]
+_EXPIRE_DELTA = (
+    timedelta(minutes=settings.jwt.access_token_expire_minutes) if settings else None
+)
+
+# Decoded tokens are cached briefly so repeated requests with the same bearer
+# token skip signature verification. Entries never outlive the token's exp.
+TOKEN_CACHE_TTL_SECONDS = 30
+TOKEN_CACHE_MAX_SIZE = 10_000
+
+
+def _token_expiry(token: str, value: tuple, now: float) -> float:
+    """Cache expiry for a decoded token: min(now + TTL, token exp)."""
+    _, exp = value
+    return min(now + TOKEN_CACHE_TTL_SECONDS, exp)
+
+
+_token_cache = TLRUCache(
+    maxsize=TOKEN_CACHE_MAX_SIZE, ttu=_token_expiry, timer=time.time
+)
+
 def create_access_token(data: dict) -> str:
     """
     Creates a new JWT access token.
@@ -21,17 +49,10 @@ def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     
     # Set the token expiration time
-    expire = datetime.now(UTC) + timedelta(
-        minutes=settings.jwt.access_token_expire_minutes
-    )
-    to_encode.update({"exp": expire})
+    to_encode["exp"] = datetime.now(UTC) + _EXPIRE_DELTA
     
     # Encode the token with our secret key and algorithm
-    encoded_jwt = jwt.encode(
-        to_encode, 
-        settings.jwt.secret_key, 
-        algorithm=settings.jwt.algorithm
-    )
+    encoded_jwt = jwt.encode(to_encode, _SECRET_KEY, algorithm=_ALGORITHM)
     return encoded_jwt
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> TokenData:
@@ -41,6 +62,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> TokenData:
     This function will be used on all protected endpoints.
     It automatically validates the 'Authorization: Bearer <token>' header.
     """
+    cached = _token_cache.get(token)
+    if cached is not None:
+        return cached[0]
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -49,11 +74,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> TokenData:
     
     try:
         # Decode the token
-        payload = jwt.decode(
-            token,
-            settings.jwt.secret_key,
-            algorithms=[settings.jwt.algorithm]
-        )
+        payload = jwt.decode(token, _SECRET_KEY, algorithms=_ALGORITHMS)
         
         # The 'sub' (subject) field should contain our user's email
         email: str = payload.get("sub")
@@ -66,7 +87,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> TokenData:
         # Validate the payload against our TokenData model
         token_data = TokenData(email=email, role=role, user_id=user_id)
         
-    except (JWTError, ValidationError):
+    except (InvalidTokenError, ValidationError):
         raise credentials_exception
-        
+
+    exp = payload.get("exp")
+    if exp is not None:
+        _token_cache[token] = (token_data, exp)
+
     return token_data
\ No newline at end of file
@@ -26,6 +26,13 @@ def require_role(*allowed_roles: UserRole):
     Raises:
         HTTPException: 403 Forbidden if user's role is not in allowed_roles
     """
+    # Resolved once per decorated endpoint rather than on every request
+    allowed = frozenset(allowed_roles)
+    forbidden_detail = (
+        f"Insufficient permissions. Required role: "
+        f"{', '.join([r.value for r in allowed_roles])}"
+    )
+
     def decorator(func: Callable):
         @wraps(func)
         async def wrapper(*args, **kwargs):
@@ -38,10 +45,10 @@ def require_role(*allowed_roles: UserRole):
                     detail="Not authenticated"
                 )
             
-            if current_user.role not in allowed_roles:
+            if current_user.role not in allowed:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
-                    detail=f"Insufficient permissions. Required role: {', '.join([r.value for r in allowed_roles])}"
+                    detail=forbidden_detail
                 )
             
             return await func(*args, **kwargs)
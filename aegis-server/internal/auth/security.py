@@ -1,11 +1,16 @@
 # aegis-server/internal/auth/security.py
 
+import asyncio
+
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError, InvalidHashError, VerificationError
 
 # Use Argon2 directly for password hashing
-# Modern, secure standard without password length limits
-pwd_hasher = PasswordHasher()
+# Modern, secure standard without password length limits.
+# Parameters follow the OWASP argon2id server profile (19 MiB, t=2, p=1) so
+# each verify has a predictable cost; hashes made with other parameters are
+# upgraded on the next successful login (see needs_rehash).
+pwd_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -18,11 +23,15 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         bool: True if the passwords match, False otherwise.
     """
+    # Cheap format check: a stored value that isn't an Argon2 hash can never
+    # match, so skip raising and catching InvalidHashError for it.
+    if not hashed_password or not hashed_password.startswith("$argon2"):
+        return False
     try:
         pwd_hasher.verify(hashed_password, plain_password)
         return True
-    except (VerifyMismatchError, InvalidHashError, VerificationError, Exception):
-        # Return False for any verification error including invalid hash format
+    except (VerifyMismatchError, InvalidHashError, VerificationError):
+        # Mismatch or malformed hash; anything else is a real bug and propagates
         return False
 
 def get_password_hash(password: str) -> str:
@@ -35,4 +44,33 @@ def get_password_hash(password: str) -> str:
     Returns:
         str: The securely hashed and salted password.
     """
-    return pwd_hasher.hash(password)
\ No newline at end of file
+    return pwd_hasher.hash(password)
+
+def needs_rehash(hashed_password: str) -> bool:
+    """
+    Checks whether a stored hash was made with outdated Argon2 parameters.
+    
+    Args:
+        hashed_password (str): The hash stored in the database.
+        
+    Returns:
+        bool: True if the hash should be recomputed with the current parameters.
+    """
+    return pwd_hasher.check_needs_rehash(hashed_password)
+
+
+# Argon2 is CPU-bound by design and argon2-cffi releases the GIL while
+# hashing, so async endpoints run it in a worker thread instead of blocking
+# the event loop.
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Async variant of verify_password that runs in a worker thread.
+    """
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
+
+async def aget_password_hash(password: str) -> str:
+    """
+    Async variant of get_password_hash that runs in a worker thread.
+    """
+    return await asyncio.to_thread(get_password_hash, password)
\ No newline at end of file
@@ -1,8 +1,9 @@
 # aegis-server/internal/config/config.py
 
+import tomllib
+from functools import lru_cache
 from pathlib import Path
 
-import tomli  # We installed this in Module 7
 from pydantic import BaseModel
 
 CONFIG_FILE_PATH = Path("config.toml")
@@ -12,19 +13,31 @@ class DBSettings(BaseModel):
     password: str
     database: str
     host: str
+    # Connection pool size per server process
+    pool_min_size: int = 5
+    pool_max_size: int = 30
 
 class JWTSettings(BaseModel):
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
 
+class ServerSettings(BaseModel):
+    host: str = "0.0.0.0"
+    port: int = 8000
+    # uvicorn worker processes; each runs its own pool and background tasks
+    workers: int = 1
+
 class Settings(BaseModel):
     database: DBSettings
     jwt: JWTSettings
+    server: ServerSettings = ServerSettings()
 
+@lru_cache(maxsize=1)
 def load_config() -> Settings:
     """
     Loads configuration from config.toml file.
+    The file is read and validated once per process.
     """
     if not CONFIG_FILE_PATH.exists():
         print(f"CRITICAL: Configuration file not found at {CONFIG_FILE_PATH.resolve()}")
@@ -32,8 +45,7 @@ def load_config() -> Settings:
         raise FileNotFoundError("config.toml not found")
 
     try:
-        with open(CONFIG_FILE_PATH, "rb") as f:
-            data = tomli.load(f)
+        data = tomllib.loads(CONFIG_FILE_PATH.read_text(encoding="utf-8"))
         settings = Settings.model_validate(data)
         
         # Check for placeholder secret key
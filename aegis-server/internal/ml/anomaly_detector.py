@@ -41,7 +41,11 @@ class AnomalyDetector:
         if not model_path.exists():
             raise FileNotFoundError(f"Model not found: {model_path}")
         
-        self.model = joblib.load(model_path)
+        # Memory-map the model's numpy arrays read-only instead of copying
+        # them onto the heap, so server workers loading the same file share
+        # those pages through the page cache (only effective for models
+        # saved without joblib compression)
+        self.model = joblib.load(model_path, mmap_mode='r')
         self.scaler = joblib.load(scaler_path)
         
         import json
@@ -60,34 +64,18 @@ class AnomalyDetector:
         Returns:
             Tuple of (is_anomaly, anomaly_score, severity)
         """
-        # Ensure all features present
-        feature_values = []
-        for feat_name in self.feature_names:
-            feature_values.append(features.get(feat_name, 0))
-        
-        # Convert to DataFrame for prediction
-        X = pd.DataFrame([feature_values], columns=self.feature_names)
-        
-        # Scale features
-        X_scaled = self.scaler.transform(X)
-        
-        # Predict
-        prediction = self.model.predict(X_scaled)[0]
-        score = self.model.score_samples(X_scaled)[0]
-        
-        is_anomaly = (prediction == -1)
-        
-        # Determine severity
+        return self.batch_predict([features])[0]
+    
+    @staticmethod
+    def _severity(score: float) -> str:
+        """Severity of an anomaly score"""
         if score < -0.6:
-            severity = "HIGH"
+            return "HIGH"
         elif score < -0.5:
-            severity = "MEDIUM"
+            return "MEDIUM"
         elif score < -0.4:
-            severity = "LOW"
-        else:
-            severity = "NORMAL"
-        
-        return is_anomaly, float(score), severity
+            return "LOW"
+        return "NORMAL"
     
     def get_feature_contributions(self, features: Dict[str, float]) -> Dict[str, float]:
         """
@@ -119,7 +107,8 @@ class AnomalyDetector:
     
     def batch_predict(self, features_list: list) -> list:
         """
-        Predict on batch of samples
+        Predict on batch of samples, scaling and scoring all of them in one
+        call each
         
         Args:
             features_list: List of feature dictionaries
@@ -127,10 +116,29 @@ class AnomalyDetector:
         Returns:
             List of (is_anomaly, score, severity) tuples
         """
-        results = []
-        for features in features_list:
-            results.append(self.predict(features))
-        return results
+        if not features_list:
+            return []
+        
+        # Fill a float32 matrix one feature column at a time (column-major,
+        # so each column is contiguous), missing features as 0. The scaler
+        # keeps float32, and the trees compare in float32 anyway
+        X = np.empty((len(features_list), len(self.feature_names)), dtype=np.float32, order='F')
+        for j, feat_name in enumerate(self.feature_names):
+            X[:, j] = [features.get(feat_name, 0) for features in features_list]
+        
+        # Scale features; the DataFrame only labels the columns, without copying
+        X_scaled = self.scaler.transform(pd.DataFrame(X, columns=self.feature_names, copy=False))
+        X_scaled = np.ascontiguousarray(X_scaled, dtype=np.float32)
+        
+        # Score once: IsolationForest.predict() is score_samples() compared
+        # against offset_, so calling both would walk every tree twice
+        scores = self.model.score_samples(X_scaled)
+        is_anomaly = scores < self.model.offset_
+        
+        return [
+            (bool(anomaly), float(score), self._severity(score))
+            for anomaly, score in zip(is_anomaly, scores, strict=True)
+        ]
     
     def get_model_info(self) -> Dict:
         """Get model information"""
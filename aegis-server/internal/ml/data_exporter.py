@@ -11,19 +11,590 @@ Author: Mokshit Bindal
 Date: November 13, 2025
 """
 
+import asyncio
 import json
 import logging
 import os
-from datetime import datetime, timezone
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 from uuid import UUID
 
 import asyncpg
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from internal.config.config import settings
 
 logger = logging.getLogger(__name__)
 
+_TS = pa.timestamp("us", tz="UTC")
+
+# Low-cardinality strings (hostnames, users, shells, ...) are kept as
+# dictionary arrays from the CSV parse through to the Parquet readers, so
+# each distinct value is stored once per batch and read back without being
+# expanded into one string per row
+_DICT = pa.dictionary(pa.int32(), pa.string())
+
+# Parquet exports are laid out Hive-style, <type>/agent_id=<id>/date=<day>/,
+# so reads for one agent or a date range skip whole directories
+PARTITION_SCHEMA = pa.schema([
+    ("agent_id", pa.string()),
+    ("date", pa.date32()),
+])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+# Directory value of a NULL partition key (e.g. a command without an
+# agent_id); Arrow's hive partitioning reads it back as null
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+@dataclass(slots=True, frozen=True)
+class ExportSpec:
+    """
+    How one data type is exported. The export queries are generated from
+    it, so all four data types share one export path.
+    """
+
+    data_type: str
+    table: str
+    # SELECT list of an export, without exported_at
+    columns: str
+    # Parquet schema, declared up front so Arrow never infers types
+    schema: pa.Schema
+    # Column read_export filters time ranges on
+    time_column: str
+    # Plural noun for log messages
+    noun: str
+    # High-water mark column: "id", or "timestamp" for tables without one
+    key: str = "id"
+    
+    def range_sql(self) -> str:
+        """
+        (last exported, export end) for the next export. Tables without an
+        id leave the last minute for the next export so slightly delayed
+        agent batches aren't skipped.
+        """
+        if self.key == "id":
+            return f"""
+                SELECT
+                    COALESCE(
+                        (SELECT last_exported_id FROM export_tracking
+                         WHERE data_type = '{self.data_type}'),
+                        0
+                    ),
+                    MAX(id)
+                FROM {self.table}
+            """
+        return f"""
+            SELECT
+                (SELECT last_exported_timestamp FROM export_tracking
+                 WHERE data_type = '{self.data_type}'),
+                NOW() - INTERVAL '1 minute'
+        """
+    
+    def file_schema(self) -> pa.Schema:
+        """Schema of the Parquet files; partition columns live in directory names"""
+        return pa.schema([f for f in self.schema if f.name not in PARTITION_SCHEMA.names])
+    
+    def select_sql(self, for_csv: bool = False) -> str:
+        """
+        Rows with $1 < key <= $2 ($1 NULL means no lower bound). CSV exports
+        take exported_at from the server; Parquet exports add it themselves.
+        """
+        columns = f"{self.columns}, NOW() AS exported_at" if for_csv else self.columns
+        lower = "$1" if self.key == "id" else "COALESCE($1::timestamptz, '-infinity')"
+        return f"""
+            SELECT {columns}
+            FROM {self.table}
+            WHERE {self.key} > {lower} AND {self.key} <= $2
+            ORDER BY {self.key}
+        """
+    
+    def track_and_trim_sql(self) -> str:
+        """
+        Record the high-water mark $1 and the $2 rows exported, and trim the
+        live table to its $3 most recent rows (0 disables the trim), in one
+        round trip. Returns the number of rows deleted.
+        
+        Id-keyed tables keep ids above MAX(id) - $3, a single index probe
+        (gaps from rolled-back inserts keep slightly fewer rows). Other
+        tables find the $3-th newest key with an index scan, which is skipped
+        while TimescaleDB's statistics estimate no more than $3 rows.
+        """
+        if self.key == "id":
+            insert = (
+                "(data_type, last_exported_id, total_exported, last_export_count) "
+                f"VALUES ('{self.data_type}', $1, $2, $2)"
+            )
+            mark = "last_exported_id"
+            keep = f"id <= (SELECT MAX(id) FROM {self.table}) - $3"
+        else:
+            insert = (
+                "(data_type, last_exported_id, last_exported_timestamp, total_exported, last_export_count) "
+                f"VALUES ('{self.data_type}', 0, $1, $2, $2)"
+            )
+            mark = "last_exported_timestamp"
+            keep = f"""approximate_row_count('{self.table}') > $3
+                    AND {self.key} < (
+                        SELECT {self.key} FROM {self.table}
+                        ORDER BY {self.key} DESC
+                        LIMIT 1 OFFSET GREATEST($3 - 1, 0)
+                    )"""
+        return f"""
+            WITH tracked AS (
+                INSERT INTO export_tracking {insert}
+                ON CONFLICT (data_type)
+                DO UPDATE SET
+                    {mark} = $1,
+                    last_export_time = CURRENT_TIMESTAMP,
+                    total_exported = export_tracking.total_exported + $2,
+                    last_export_count = $2
+            ),
+            deleted AS (
+                DELETE FROM {self.table}
+                WHERE $3::int > 0
+                    AND {self.key} <= $1
+                    AND {keep}
+                RETURNING 1
+            )
+            SELECT count(*) FROM deleted
+        """
+    
+    def new_rows_sql(self) -> str:
+        """
+        Rows past the high-water mark, capped at $1 (NULL means no cap).
+        Id-keyed tables take the difference between MAX(id) and the mark, a
+        single primary-key index probe (ids skipped by rolled-back inserts
+        overcount slightly, which is fine for a threshold). Other tables
+        count rows past the mark and stop as soon as the cap is reached.
+        """
+        if self.key == "id":
+            return f"""
+                SELECT GREATEST(LEAST(
+                    COALESCE(MAX(id), 0) - COALESCE(
+                        (SELECT last_exported_id FROM export_tracking WHERE data_type = '{self.data_type}'),
+                        0
+                    ),
+                    $1::bigint
+                ), 0)
+                FROM {self.table}
+            """
+        return f"""
+            SELECT count(*) FROM (
+                SELECT 1 FROM {self.table}
+                WHERE {self.key} > COALESCE(
+                    (SELECT last_exported_timestamp FROM export_tracking WHERE data_type = '{self.data_type}'),
+                    '-infinity'
+                )
+                LIMIT $1
+            ) new_rows
+        """
+
+
+# Data types exported for ML training
+EXPORT_SPECS = {
+    spec.data_type: spec
+    for spec in (
+        ExportSpec(
+            data_type="logs",
+            table="logs",
+            columns="timestamp, agent_id::text AS agent_id, hostname, raw_data::text AS raw_data",
+            schema=pa.schema([
+                ("timestamp", _TS),
+                ("agent_id", pa.string()),
+                ("hostname", _DICT),
+                ("raw_data", pa.string()),
+                ("exported_at", _TS),
+            ]),
+            time_column="timestamp",
+            noun="logs",
+            # logs is a TimescaleDB hypertable with NO id column
+            key="timestamp",
+        ),
+        ExportSpec(
+            data_type="metrics",
+            table="system_metrics",
+            # Flattened out of the JSONB payloads by the server, so exports
+            # never parse or walk the JSON in Python
+            columns="""
+                id, agent_id::text AS agent_id, timestamp,
+                cpu_percent,
+                (cpu_data->>'cpu_count')::float8 AS cpu_count,
+                memory_percent,
+                (memory_data->>'memory_available')::float8 AS memory_available,
+                (memory_data->>'memory_total')::float8 AS memory_total,
+                disk_percent,
+                COALESCE(disk_data->>'disk_used', disk_data->>'used')::float8 AS disk_used,
+                COALESCE(disk_data->>'disk_total', disk_data->>'total')::float8 AS disk_total,
+                net_bytes_sent AS network_bytes_sent,
+                net_bytes_recv AS network_bytes_recv,
+                COALESCE(process_data->>'process_count', process_data->>'total')::float8 AS process_count,
+                (process_data->>'running')::float8 AS process_running
+            """,
+            schema=pa.schema([
+                ("id", pa.int64()),
+                ("agent_id", pa.string()),
+                ("timestamp", _TS),
+                ("cpu_percent", pa.float64()),
+                ("cpu_count", pa.float64()),
+                ("memory_percent", pa.float64()),
+                ("memory_available", pa.float64()),
+                ("memory_total", pa.float64()),
+                ("disk_percent", pa.float64()),
+                ("disk_used", pa.float64()),
+                ("disk_total", pa.float64()),
+                ("network_bytes_sent", pa.float64()),
+                ("network_bytes_recv", pa.float64()),
+                ("process_count", pa.float64()),
+                ("process_running", pa.float64()),
+                ("exported_at", _TS),
+            ]),
+            time_column="timestamp",
+            noun="metrics",
+        ),
+        ExportSpec(
+            data_type="processes",
+            table="processes_history",
+            columns="""
+                id, agent_id::text AS agent_id, name, pid, cpu_percent, memory_percent,
+                status, cmdline, username, collected_at
+            """,
+            schema=pa.schema([
+                ("id", pa.int64()),
+                ("agent_id", pa.string()),
+                ("name", _DICT),
+                ("pid", pa.int64()),
+                ("cpu_percent", pa.float64()),
+                ("memory_percent", pa.float64()),
+                ("status", _DICT),
+                ("cmdline", pa.string()),
+                ("username", _DICT),
+                ("collected_at", _TS),
+                ("exported_at", _TS),
+            ]),
+            time_column="collected_at",
+            noun="process snapshots",
+        ),
+        ExportSpec(
+            data_type="commands",
+            table="commands",
+            columns="""
+                id, agent_id::text AS agent_id, command, user_name, timestamp,
+                shell, working_directory, exit_code
+            """,
+            schema=pa.schema([
+                ("id", pa.int64()),
+                ("agent_id", pa.string()),
+                ("command", pa.string()),
+                ("user_name", _DICT),
+                ("timestamp", _TS),
+                ("shell", _DICT),
+                ("working_directory", _DICT),
+                ("exit_code", pa.int64()),
+                ("exported_at", _TS),
+            ]),
+            time_column="timestamp",
+            noun="commands",
+        ),
+    )
+}
+
+DATA_TYPES = tuple(EXPORT_SPECS)
+
+# Source table and time column of each part of a labeled dataset
+LABELED_SOURCES = {
+    "logs": ("logs", "timestamp"),
+    "metrics": ("system_metrics", "timestamp"),
+    "commands": ("commands", "timestamp"),
+    "processes": ("processes", "collected_at"),
+}
+
+# Data types whose thresholds trigger an export
+TRIGGER_TYPES = ("logs", "metrics")
+
+# Longest the ingest counters are trusted without counting new rows in the
+# database (rows written by other servers aren't seen by the counters)
+NEW_ROWS_RECOUNT_INTERVAL = timedelta(hours=1)
+
+# Rows per cursor fetch, and per Parquet row group, of a labeled dataset
+LABELED_BATCH_SIZE = 10000
+
+# Worker threads for export file writes and Parquet encoding, kept apart
+# from the default executor (password hashing) and few enough that exports
+# can't take every CPU away from ingestion
+EXPORT_IO_WORKERS = 2
+
+# COPY output is buffered up to this many bytes before each file write
+CSV_WRITE_BUFFER_SIZE = 1 << 20
+
+# Most buffers a single writev() call accepts on Linux
+IOV_MAX = 1024
+
+PARQUET_OPTIONS = {
+    "compression": "zstd",
+    "compression_level": 3,
+    "use_dictionary": True,
+}
+
+# Rows buffered per partition before they are written as one row group.
+# CSV blocks are split across partitions, so writing each part as it
+# comes would leave files full of tiny, poorly compressed row groups.
+PARQUET_ROW_GROUP_SIZE = 64 * 1024
+
+# The Parquet writer emits every page and column chunk header as its own
+# small write; they are collected up to this many bytes per write() call
+PARQUET_WRITE_BUFFER_SIZE = 1 << 20
+
+
+# Arrow's uuid type: 16 raw bytes per value, not a 36-character string
+_UUID = pa.uuid()
+
+# Arrow types of the PostgreSQL column types in labeled datasets; anything
+# else (JSON, arrays, inet, numeric, ...) is written as text
+_PG_ARROW_TYPES = {
+    "uuid": _UUID,
+    "bool": pa.bool_(),
+    "int2": pa.int16(),
+    "int4": pa.int32(),
+    "int8": pa.int64(),
+    "float4": pa.float32(),
+    "float8": pa.float64(),
+    "text": pa.string(),
+    "varchar": pa.string(),
+    "bpchar": pa.string(),
+    "bytea": pa.binary(),
+    "date": pa.date32(),
+    "timestamp": pa.timestamp("us"),
+    "timestamptz": _TS,
+}
+
+
+def _query_schema(statement: asyncpg.prepared_stmt.PreparedStatement) -> pa.Schema:
+    """Arrow schema of a prepared query's result columns"""
+    return pa.schema([
+        (attr.name, _PG_ARROW_TYPES.get(attr.type.name, pa.string()))
+        for attr in statement.get_attributes()
+    ])
+
+
+def _arrow_column(values: list, type: pa.DataType) -> pa.Array:
+    """Build an Arrow column of the given type from database values"""
+    if type == _UUID:
+        storage = pa.array([None if v is None else v.bytes for v in values], type=pa.binary(16))
+        return pa.ExtensionArray.from_storage(_UUID, storage)
+    if pa.types.is_string(type):
+        return pa.array([
+            v if v is None or isinstance(v, str)
+            else json.dumps(v) if isinstance(v, (dict, list))
+            else str(v)
+            for v in values
+        ], type=type)
+    return pa.array(values, type=type)
+
+
+def _write_records(writer: pq.ParquetWriter, schema: pa.Schema, rows: List[asyncpg.Record]):
+    """Append database records to a Parquet file as one row group (blocking)"""
+    writer.write_batch(pa.RecordBatch.from_arrays(
+        [
+            _arrow_column(list(values), field.type)
+            for field, values in zip(schema, zip(*rows, strict=True), strict=True)
+        ],
+        schema=schema,
+    ))
+
+
+def _disk_size(path: Path) -> int:
+    """Size of an export on disk: a CSV file or a Parquet dataset directory"""
+    if path.is_dir():
+        return sum(f.stat().st_size for f in path.rglob("*.parquet"))
+    return path.stat().st_size if path.exists() else 0
+
+
+def _writev_all(fd: int, chunks: List[bytes]):
+    """Write chunks to fd with one writev() per IOV_MAX chunks (blocking)"""
+    for i in range(0, len(chunks), IOV_MAX):
+        batch = chunks[i:i + IOV_MAX]
+        written = os.writev(fd, batch)
+        if written < sum(map(len, batch)):
+            # Finish a short write with plain writes
+            rest = memoryview(b"".join(batch))[written:]
+            while rest:
+                rest = rest[os.write(fd, rest):]
+
+
+def _csv_convert_options(fields) -> pa_csv.ConvertOptions:
+    """Arrow CSV conversion of COPY ... CSV output into the given fields' types"""
+    return pa_csv.ConvertOptions(
+        column_types={f.name: f.type for f in fields},
+        # COPY writes NULL unquoted and empty strings quoted
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=False,
+    )
+
+
+def _utc_date(value: datetime) -> date:
+    """UTC calendar day of a datetime (naive values are taken as UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).date()
+
+
+def _matching(values: pa.Array, value) -> pa.Array:
+    """Mask of the entries equal to a partition key; a None key matches nulls"""
+    if value is None:
+        return pc.is_null(values)
+    return pc.fill_null(pc.equal(values, value), False)
+
+
+def _partition_value(value) -> str:
+    """Directory value of a partition key"""
+    if value is None:
+        return NULL_PARTITION
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+
+def _all_of(conditions: List[ds.Expression]) -> Optional[ds.Expression]:
+    """AND filter expressions together (None when there are none)"""
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+class _PartitionWriters:
+    """
+    Parquet writers for one export: one file named after the export time in
+    each agent_id=/date= partition the export touches. Rows are buffered per
+    partition and appended as row groups of PARQUET_ROW_GROUP_SIZE rows.
+    Each file is complete (footer included) once closed, so the dataset
+    stays readable by the download endpoint while exports keep landing.
+    
+    Files are written under a hidden staging name, which Arrow datasets
+    and the *.parquet globs skip, and only renamed into place by publish()
+    once the export's tracking transaction has committed; discard()
+    removes them if it doesn't. Blocking; used from a worker thread.
+    """
+    
+    def __init__(self, root: Path, spec: ExportSpec, exported_at: datetime):
+        self.root = root
+        self.spec = spec
+        # Bytes written, known once closed
+        self.size = 0
+        self.file_name = f"part-{exported_at:%Y%m%d%H%M%S%f}.parquet"
+        self.staged_name = f".{self.file_name}.tmp"
+        self.file_schema = spec.file_schema()
+        # Every row of the export shares one exported_at, broadcast per batch
+        self.exported_at = pa.scalar(exported_at, type=_TS)
+        # (agent_id, date) -> (sink, writer); the sink is owned here so its
+        # position gives the file size once the writer is closed
+        self._writers: Dict[Tuple[str, date], Tuple[pa.NativeFile, pq.ParquetWriter]] = {}
+        # (agent_id, date) -> record batches not yet written
+        self._pending: Dict[Tuple[str, date], List[pa.RecordBatch]] = defaultdict(list)
+    
+    @property
+    def file_count(self) -> int:
+        return len(self._writers)
+    
+    def write_csv(self, path: str):
+        """
+        Parse a COPY ... CSV HEADER file of the spec's columns in blocks with
+        Arrow's CSV reader, straight into columns of the schema's types
+        """
+        convert_options = _csv_convert_options(f for f in self.spec.schema if f.name != "exported_at")
+        for batch in pa_csv.open_csv(path, convert_options=convert_options):
+            self.write(batch)
+    
+    def write(self, batch: pa.RecordBatch):
+        """Split a record batch by partition, writing each partition's full row groups"""
+        agent_ids = batch.column("agent_id")
+        days = pc.cast(batch.column(self.spec.time_column), pa.date32())
+        keys = pa.table({"agent_id": agent_ids, "date": days}).group_by(["agent_id", "date"]).aggregate([])
+        
+        for agent_id, day in zip(
+            keys.column("agent_id").to_pylist(), keys.column("date").to_pylist(), strict=True
+        ):
+            # Null keys form their own partition; comparing against them would
+            # match nothing and silently drop those rows from the export
+            part = batch.filter(pc.and_(_matching(agent_ids, agent_id), _matching(days, day)))
+            arrays = [part.column(f.name) for f in self.file_schema if f.name != "exported_at"]
+            arrays.append(pa.repeat(self.exported_at, part.num_rows))
+            
+            key = (agent_id, day)
+            pending = self._pending[key]
+            pending.append(pa.RecordBatch.from_arrays(arrays, schema=self.file_schema))
+            if sum(b.num_rows for b in pending) >= PARQUET_ROW_GROUP_SIZE:
+                self._flush(key)
+    
+    def _flush(self, key: Tuple[str, date]):
+        """Append a partition's buffered rows to its file as one row group"""
+        batches = self._pending.pop(key, None)
+        if not batches:
+            return
+        if key not in self._writers:
+            self._writers[key] = self._open(*key)
+        _, writer = self._writers[key]
+        writer.write_table(pa.Table.from_batches(batches, schema=self.file_schema), row_group_size=PARQUET_ROW_GROUP_SIZE)
+    
+    def _directory(self, agent_id: Optional[str], day: Optional[date]) -> Path:
+        return self.root / f"agent_id={_partition_value(agent_id)}" / f"date={_partition_value(day)}"
+    
+    def _open(self, agent_id: Optional[str], day: Optional[date]) -> Tuple[pa.NativeFile, pq.ParquetWriter]:
+        directory = self._directory(agent_id, day)
+        directory.mkdir(parents=True, exist_ok=True)
+        sink = pa.BufferedOutputStream(pa.OSFile(str(directory / self.staged_name), "wb"), PARQUET_WRITE_BUFFER_SIZE)
+        return sink, pq.ParquetWriter(sink, self.file_schema, **PARQUET_OPTIONS)
+    
+    def close(self) -> int:
+        """Write what is still buffered, close every file and return the bytes written"""
+        for key in list(self._pending):
+            self._flush(key)
+        
+        self.size = 0
+        for sink, writer in self._writers.values():
+            writer.close()
+            self.size += sink.tell()
+            sink.close()
+        return self.size
+    
+    def publish(self):
+        """Rename the closed files into place, making them part of the dataset"""
+        for key in self._writers:
+            directory = self._directory(*key)
+            os.replace(directory / self.staged_name, directory / self.file_name)
+    
+    def discard(self):
+        """Remove the files of an export that was rolled back"""
+        for key in self._writers:
+            (self._directory(*key) / self.staged_name).unlink(missing_ok=True)
+
+
+class _CsvAppend:
+    """
+    Rows one export appended to a CSV export file. Appends can't be staged,
+    so publish() has nothing to do and discard() truncates the file back to
+    where the export started.
+    """
+    
+    def __init__(self, root: Path, fd: int, offset: int, size: int):
+        self.root = root
+        self.fd = fd
+        self.offset = offset
+        self.size = size
+    
+    def publish(self):
+        pass
+    
+    def discard(self):
+        os.ftruncate(self.fd, self.offset)
+
 
 class DataExporter:
     """
@@ -55,17 +626,25 @@ class DataExporter:
             "commands": 1000,
         }
         
-        # Track last export counts
-        self.last_export_counts = {
-            "logs": 0,
-            "metrics": 0,
-            "processes": 0,
-            "commands": 0,
-        }
+        # Rows written by the most recent export of each type, restored from
+        # export_tracking by initialize(). What has been exported so far (the
+        # high-water mark) lives there too.
+        self.last_export_counts = dict.fromkeys(DATA_TYPES, 0)
         
         # Track last export time
         self.last_export_time = None
         
+        # Rows not yet exported per data type: counted in the database by a
+        # threshold check, then bumped by the ingest routes (note_inserted) so
+        # checks on an idle server can skip the database
+        self._new_rows = dict.fromkeys(DATA_TYPES, 0)
+        self._new_rows_counted_at: Optional[datetime] = None
+        # The ingest counters only see this process's inserts. With several
+        # uvicorn workers each would see a fraction of them, so they are only
+        # kept by a single-worker server; otherwise every check counts in
+        # the database
+        self._track_inserts = settings is None or settings.server.workers == 1
+        
         # Auto-delete from live view after export (keeps in files for admin download)
         self.auto_cleanup = True
         
@@ -77,6 +656,25 @@ class DataExporter:
             "commands": 200,
         }
         
+        # Export file format: "parquet" (one zstd-compressed file per export
+        # under <export_dir>/<type>/) or "csv" (legacy single appended file)
+        self.format = "parquet"
+        
+        # Bytes in each export (CSV file or Parquet dataset directory), read
+        # from disk once here and then counted as exports are written
+        self._export_bytes = {
+            path: _disk_size(path)
+            for data_type in DATA_TYPES
+            for path in (self.export_dir / f"{data_type}.csv", self.export_dir / data_type)
+        }
+        
+        # Append-only descriptors of the CSV exports, opened on first use and
+        # kept for the life of the process (see close())
+        self._csv_fds: Dict[Path, int] = {}
+        
+        # Export file I/O runs here, off the event loop (see _run_io())
+        self._io_pool = ThreadPoolExecutor(max_workers=EXPORT_IO_WORKERS, thread_name_prefix="aegis-export")
+        
         logger.info(f"Data exporter initialized. Export directory: {self.export_dir}")
     
     async def check_and_export(self, force: bool = False):
@@ -92,463 +690,453 @@ class DataExporter:
         Returns:
             Dict with counts of exported items
         """
+        if not force and self._below_thresholds():
+            return dict.fromkeys(DATA_TYPES, 0)
+        
         try:
-            # Check if any threshold is exceeded
-            should_export = force
-            
-            if not force:
-                async with self.pool.acquire() as conn:
-                    # Check each data type against its threshold
-                    logs_count = await conn.fetchval("SELECT COUNT(*) FROM logs")
-                    new_logs = logs_count - self.last_export_counts['logs']
-                    
-                    metrics_count = await conn.fetchval("SELECT COUNT(*) FROM system_metrics")
-                    new_metrics = metrics_count - self.last_export_counts['metrics']
+            async with self.pool.acquire() as conn:
+                # Check if any threshold is exceeded
+                should_export = force
+                
+                if not force:
+                    # Count rows added since the last export, stopping at the threshold
+                    for data_type in TRIGGER_TYPES:
+                        self._new_rows[data_type] = await self.count_new_rows(
+                            conn, data_type, self.thresholds[data_type]
+                        )
+                    self._new_rows_counted_at = datetime.now(timezone.utc)
                     
                     # Check if ANY threshold is exceeded
-                    if (new_logs >= self.thresholds['logs'] or 
-                        new_metrics >= self.thresholds['metrics']):
+                    if any(self._new_rows[t] >= self.thresholds[t] for t in TRIGGER_TYPES):
                         should_export = True
-                        logger.info(f"Export triggered: logs={new_logs}/{self.thresholds['logs']}, metrics={new_metrics}/{self.thresholds['metrics']}")
-            
-            result = {}
-            if should_export:
-                # Export ALL data types when triggered
-                result['logs'] = await self._check_and_export_logs(force=True)
-                result['metrics'] = await self._check_and_export_metrics(force=True)
-                result['processes'] = await self._check_and_export_processes(force=True)
-                result['commands'] = await self._check_and_export_commands(force=True)
+                        progress = ", ".join(f"{t}={self._new_rows[t]}/{self.thresholds[t]}" for t in TRIGGER_TYPES)
+                        logger.info(f"Export triggered: {progress}")
                 
-                # Update last export time
-                self.last_export_time = datetime.now(timezone.utc)
-            else:
-                result = {'logs': 0, 'metrics': 0, 'processes': 0, 'commands': 0}
+                result = {}
+                if should_export:
+                    # Export ALL data types when triggered. The tables and
+                    # files are disjoint, so run them concurrently, one
+                    # connection per table (the first reuses the one already
+                    # held); one failure doesn't cancel the others.
+                    first, *rest = EXPORT_SPECS.values()
+                    counts = await asyncio.gather(
+                        self._check_and_export(first, force=True, conn=conn),
+                        *(self._check_and_export(spec, force=True) for spec in rest),
+                        return_exceptions=True,
+                    )
+                    for data_type, count in zip(DATA_TYPES, counts, strict=True):
+                        if isinstance(count, Exception):
+                            logger.error(f"Error exporting {data_type}: {count}")
+                            count = 0
+                        result[data_type] = count
+                    
+                    # Update last export time
+                    self.last_export_time = datetime.now(timezone.utc)
+                    self._new_rows = dict.fromkeys(DATA_TYPES, 0)
+                else:
+                    result = dict.fromkeys(DATA_TYPES, 0)
             
             return result
         except Exception as e:
             logger.error(f"Error in data export check: {e}")
             raise
     
-    async def _check_and_export_logs(self, force: bool = False):
+    def note_inserted(self, data_type: str, count: int = 1):
+        """Record rows just inserted by an ingest route"""
+        if self._track_inserts:
+            self._new_rows[data_type] += count
+    
+    def tracked_new_rows(self, data_type: str) -> Optional[int]:
         """
-        Export logs if threshold exceeded
-        
-        Args:
-            force: If True, export regardless of threshold
-            
-        Returns:
-            Number of logs exported
+        Rows of a data type not yet exported, as tracked by the ingest
+        counters since the last database count. None when the type isn't
+        tracked, the counters aren't kept (several workers), or that count
+        is missing or stale.
         """
-        async with self.pool.acquire() as conn:
-            # Get total log count
-            result = await conn.fetchrow("SELECT COUNT(*) as count FROM logs")
-            total_count = result['count']
-            
-            new_logs = total_count - self.last_export_counts['logs']
-            
-            if force or new_logs >= self.thresholds['logs']:
-                logger.info(f"Exporting ALL logs from database (total: {total_count}, new: {new_logs})")
-                
-                # Fetch ALL logs (export everything in the database)
-                # Note: logs table is a TimescaleDB hypertable with NO id column
-                # Columns: timestamp, agent_id, hostname, raw_data
-                logs = await conn.fetch(
-                    """
-                    SELECT timestamp, agent_id, hostname, raw_data
-                    FROM logs
-                    ORDER BY timestamp ASC
-                    """
-                )
-                
-                if logs:
-                    # Export to file
-                    export_path = await self._export_logs_to_file(logs)
-                    
-                    # Update last export count BEFORE cleanup
-                    # This represents the total we've exported, not what remains after cleanup
-                    self.last_export_counts['logs'] = total_count
-                    
-                    # Auto-cleanup: Keep only the most recent min_live_records logs
-                    if self.auto_cleanup and total_count > self.min_live_records['logs']:
-                        # Delete all but the most recent min_live_records logs
-                        # Get the timestamp of the Nth most recent log (where N = min_live_records)
-                        cutoff_timestamp = await conn.fetchval(
-                            """
-                            SELECT timestamp FROM logs
-                            ORDER BY timestamp DESC
-                            LIMIT 1 OFFSET $1
-                            """,
-                            self.min_live_records['logs'] - 1
-                        )
-                        
-                        if cutoff_timestamp:
-                            # Delete all logs older than cutoff
-                            result = await conn.execute(
-                                "DELETE FROM logs WHERE timestamp < $1",
-                                cutoff_timestamp
-                            )
-                            # Extract count from "DELETE X" string
-                            deleted_count = int(result.split()[-1]) if result and result.startswith('DELETE') else 0
-                            logger.info(f"Cleaned up {deleted_count} old logs (keeping {self.min_live_records['logs']} most recent)")
-                    
-                    return len(logs)
-            
-            return 0
+        if not self._track_inserts:
+            return None
+        if data_type not in TRIGGER_TYPES or self._new_rows_counted_at is None:
+            return None
+        if datetime.now(timezone.utc) - self._new_rows_counted_at > NEW_ROWS_RECOUNT_INTERVAL:
+            return None
+        return self._new_rows[data_type]
     
-    async def _check_and_export_metrics(self, force: bool = False):
+    def _below_thresholds(self) -> bool:
         """
-        Export system metrics if threshold exceeded or forced
+        Whether the ingest counters show no threshold can have been reached
+        since the last database count, which must be recent
+        """
+        for t in TRIGGER_TYPES:
+            new_rows = self.tracked_new_rows(t)
+            if new_rows is None or new_rows >= self.thresholds[t]:
+                return False
+        return True
+    
+    async def count_new_rows(self, conn: asyncpg.Connection, data_type: str, limit: Optional[int] = None) -> int:
+        """
+        Count rows added since the last export of a data type.
         
         Args:
-            force: Force export regardless of threshold
+            conn: Connection to run the count on
+            data_type: One of DATA_TYPES
+            limit: Stop counting at this many rows (None counts all new rows)
         
         Returns:
-            Number of metrics exported
+            Number of new rows, capped at limit
         """
-        async with self.pool.acquire() as conn:
-            result = await conn.fetchrow("SELECT COUNT(*) as count FROM system_metrics")
-            total_count = result['count']
-            
-            new_metrics = total_count - self.last_export_counts['metrics']
-            
-            if force or new_metrics >= self.thresholds['metrics']:
-                logger.info(f"Exporting ALL metrics from database (total: {total_count}, new: {new_metrics})")
-                
-                # Fetch ALL metrics (export everything in the database)
-                metrics = await conn.fetch(
-                    """
-                    SELECT id, agent_id, timestamp, cpu_data, memory_data, 
-                           disk_data, network_data, process_data
-                    FROM system_metrics
-                    ORDER BY id
-                    """
-                )
-                
-                if metrics:
-                    export_path = await self._export_metrics_to_file(metrics)
-                    
-                    # Update last export count BEFORE cleanup
-                    self.last_export_counts['metrics'] = total_count
-                    
-                    # Auto-cleanup: Keep only the most recent min_live_records metrics
-                    if self.auto_cleanup and total_count > self.min_live_records['metrics']:
-                        # Get the ID of the Nth most recent metric (where N = min_live_records)
-                        cutoff_id = await conn.fetchval(
-                            "SELECT id FROM system_metrics ORDER BY id DESC LIMIT 1 OFFSET $1",
-                            self.min_live_records['metrics'] - 1
-                        )
-                        
-                        if cutoff_id:
-                            # Delete all metrics older than cutoff
-                            result = await conn.execute(
-                                "DELETE FROM system_metrics WHERE id < $1",
-                                cutoff_id
-                            )
-                            deleted_count = int(result.split()[-1]) if result and result.startswith('DELETE') else 0
-                            logger.info(f"Cleaned up {deleted_count} old metrics (keeping {self.min_live_records['metrics']} most recent)")
-                    
-                    return len(metrics)
-            
-            return 0
+        # The pool's statement cache prepares this once per connection and
+        # reuses the plan, as the query text is fixed per data type; holding
+        # a dedicated connection to keep explicit prepared statements would
+        # take a pool slot for good
+        return await conn.fetchval(EXPORT_SPECS[data_type].new_rows_sql(), limit)
     
-    async def _check_and_export_processes(self, force: bool = False):
+    async def _check_and_export(
+        self,
+        spec: ExportSpec,
+        force: bool = False,
+        conn: Optional[asyncpg.Connection] = None,
+    ) -> int:
         """
-        Export process snapshots if threshold exceeded or forced
+        Export a data type's rows added since the last export if its
+        threshold is exceeded or forced
         
         Args:
+            spec: Data type to export
             force: Force export regardless of threshold
+            conn: Connection to export on; one is acquired from the pool if not given
         
         Returns:
-            Number of processes exported
+            Number of rows exported
         """
-        try:
+        if conn is None:
             async with self.pool.acquire() as conn:
-                # Export from processes_history table (all snapshots for ML)
-                result = await conn.fetchrow("SELECT COUNT(*) as count FROM processes_history")
-                total_count = result['count']
-        except asyncpg.exceptions.UndefinedTableError:
-            logger.debug("Processes history table does not exist yet, skipping export")
-            return 0
+                return await self._check_and_export(spec, force, conn)
         
-        async with self.pool.acquire() as conn:
-            
-            new_processes = total_count - self.last_export_counts['processes']
+        data_type = spec.data_type
+        # Files of this export, kept out of sight until the tracking
+        # transaction commits so a rollback can't leave duplicate rows behind
+        staged = None
+        try:
+            if not force and await self.count_new_rows(conn, data_type, self.thresholds[data_type]) < self.thresholds[data_type]:
+                return 0
             
-            if force or new_processes >= self.thresholds['processes']:
-                logger.info(f"Exporting ALL process snapshots from history (total: {total_count}, new: {new_processes})")
+            async with conn.transaction():
+                # Only one server exports a data type at a time; the lock
+                # is released when the transaction ends
+                if not await conn.fetchval(
+                    "SELECT pg_try_advisory_xact_lock(hashtext($1))",
+                    f"aegis_export_{data_type}",
+                ):
+                    logger.debug(f"Another export of {spec.noun} is running, skipping")
+                    return 0
                 
-                # Fetch ALL process snapshots from history table
-                processes = await conn.fetch(
-                    """
-                    SELECT id, agent_id, name, pid, cpu_percent, memory_percent, 
-                           status, cmdline, username, collected_at
-                    FROM processes_history
-                    ORDER BY id
-                    """
-                )
+                # Export the range (last exported, export end]
+                start, end = await conn.fetchrow(spec.range_sql())
+                if end is None or (start is not None and end <= start):
+                    return 0
                 
-                if processes:
-                    export_path = await self._export_processes_to_file(processes)
-                    
-                    # Update last export count BEFORE cleanup
-                    self.last_export_counts['processes'] = total_count
-                    
-                    # Auto-cleanup: Keep only the most recent min_live_records process snapshots
-                    if self.auto_cleanup and total_count > self.min_live_records['processes']:
-                        cutoff_id = await conn.fetchval(
-                            "SELECT id FROM processes_history ORDER BY id DESC LIMIT 1 OFFSET $1",
-                            self.min_live_records['processes'] - 1
-                        )
-                        
-                        if cutoff_id:
-                            result = await conn.execute(
-                                "DELETE FROM processes_history WHERE id < $1",
-                                cutoff_id
-                            )
-                            deleted_count = int(result.split()[-1]) if result and result.startswith('DELETE') else 0
-                            logger.info(f"Cleaned up {deleted_count} old process snapshots (keeping {self.min_live_records['processes']} most recent)")
-                    
-                    return len(processes)
+                exported, staged = await self._export_to_file(conn, spec, start, end)
+                
+                deleted_count = await conn.fetchval(
+                    spec.track_and_trim_sql(),
+                    end,
+                    exported,
+                    self.min_live_records[data_type] if self.auto_cleanup else 0,
+                )
+            
+            if staged:
+                # The rows are tracked as exported now, so the files stay
+                # even if publishing them fails
+                published, staged = staged, None
+                await self._run_io(published.publish)
+                self._export_bytes[published.root] += published.size
             
+            self.last_export_counts[data_type] = exported
+            if deleted_count:
+                logger.info(f"Cleaned up {deleted_count} old {spec.noun} (keeping {self.min_live_records[data_type]} most recent)")
+            
+            return exported
+        except asyncpg.exceptions.UndefinedTableError:
+            logger.debug(f"{spec.table} table does not exist yet, skipping export")
             return 0
+        finally:
+            if staged:
+                await self._run_io(staged.discard)
     
-    async def _check_and_export_commands(self, force: bool = False):
+    async def _export_to_file(
+        self, conn: asyncpg.Connection, spec: ExportSpec, start, end
+    ) -> Tuple[int, Optional[Union[_PartitionWriters, _CsvAppend]]]:
         """
-        Export commands if threshold exceeded or forced
-        
-        Args:
-            force: Force export regardless of threshold
+        Export a data type's rows with start < key <= end
         
         Returns:
-            Number of commands exported
+            Number of rows exported, and the files written to publish or
+            discard once the export's transaction ends (None if none)
         """
-        try:
-            async with self.pool.acquire() as conn:
-                result = await conn.fetchrow("SELECT COUNT(*) as count FROM commands")
-                total_count = result['count']
-        except asyncpg.exceptions.UndefinedTableError:
-            logger.debug("Commands table does not exist yet, skipping export")
-            return 0
+        if self.format == "csv":
+            csv_file = self.export_dir / f"{spec.data_type}.csv"
+            fd = self._csv_fd(csv_file)
+            offset = os.fstat(fd).st_size
+            exported, written = await self._copy_to_csv(
+                conn,
+                fd,
+                self._export_bytes[csv_file] == 0,
+                spec.select_sql(for_csv=True),
+                start,
+                end,
+            )
+            logger.info(f"Exported {exported} {spec.noun} to {csv_file} (total file size: {(self._export_bytes[csv_file] + written) / 1024 / 1024:.2f} MB)")
+            return exported, _CsvAppend(csv_file, fd, offset, written)
         
-        async with self.pool.acquire() as conn:
-            
-            new_commands = total_count - self.last_export_counts['commands']
-            
-            if force or new_commands >= self.thresholds['commands']:
-                logger.info(f"Exporting ALL commands from database (total: {total_count}, new: {new_commands})")
-                
-                # Fetch ALL commands (export everything in the database)
-                commands = await conn.fetch(
-                    """
-                    SELECT id, agent_id, command, user_name, timestamp, 
-                           shell, working_directory, exit_code
-                    FROM commands
-                    ORDER BY id
-                    """
-                )
-                
-                if commands:
-                    export_path = await self._export_commands_to_file(commands)
-                    
-                    # Update last export count BEFORE cleanup
-                    self.last_export_counts['commands'] = total_count
-                    
-                    # Auto-cleanup: Keep only the most recent min_live_records commands
-                    if self.auto_cleanup and total_count > self.min_live_records['commands']:
-                        cutoff_id = await conn.fetchval(
-                            "SELECT id FROM commands ORDER BY id DESC LIMIT 1 OFFSET $1",
-                            self.min_live_records['commands'] - 1
-                        )
-                        
-                        if cutoff_id:
-                            result = await conn.execute(
-                                "DELETE FROM commands WHERE id < $1",
-                                cutoff_id
-                            )
-                            deleted_count = int(result.split()[-1]) if result and result.startswith('DELETE') else 0
-                            logger.info(f"Cleaned up {deleted_count} old commands (keeping {self.min_live_records['commands']} most recent)")
-                    
-                    return len(commands)
-            
-            return 0
+        return await self._export_parquet(conn, spec, start, end)
     
-    async def _export_logs_to_file(self, logs: List[asyncpg.Record]):
+    async def _export_parquet(
+        self, conn: asyncpg.Connection, spec: ExportSpec, start, end
+    ) -> Tuple[int, Optional[_PartitionWriters]]:
         """
-        Export logs to a single persistent CSV file (append mode)
+        Export rows to new Parquet files under
+        <export_dir>/<type>/agent_id=<id>/date=<day>/, one file per
+        partition per export.
+        
+        The server streams the rows with COPY ... TO STDOUT (FORMAT csv) into
+        a spool file, and Arrow's C++ CSV reader parses it block by block
+        into typed columns, so no row ever becomes a Python object. Parsing
+        and writing run in a worker thread so the event loop keeps serving
+        ingestion while the files are written.
         
         Returns:
-            Path to the logs CSV file
+            Number of rows exported, and the staged files (see _PartitionWriters)
         """
-        # Single persistent file for all logs
-        csv_file = self.export_dir / "logs.csv"
+        root = self.export_dir / spec.data_type
         
-        # Convert to list of dicts
-        logs_data = []
-        for log in logs:
-            logs_data.append({
-                'timestamp': log['timestamp'].isoformat() if log['timestamp'] else None,
-                'agent_id': str(log['agent_id']),
-                'hostname': log['hostname'],
-                'raw_data': log['raw_data'],  # JSONB column
-                'exported_at': datetime.now(timezone.utc).isoformat(),
-            })
+        # One export timestamp for the whole export, not one per row
+        exported_at = datetime.now(timezone.utc)
         
-        # Create DataFrame
-        df = pd.DataFrame(logs_data)
-        
-        # Append to existing file (or create new with header)
-        file_exists = csv_file.exists()
-        df.to_csv(csv_file, mode='a', header=not file_exists, index=False)
+        with tempfile.NamedTemporaryFile(dir=self.export_dir, prefix=f".{spec.data_type}-", suffix=".csv") as spool:
+            exported, _ = await self._copy_to_csv(conn, spool.fileno(), True, spec.select_sql(), start, end)
+            if not exported:
+                return 0, None
+            
+            writers = _PartitionWriters(root, spec, exported_at)
+            try:
+                try:
+                    await self._run_io(writers.write_csv, spool.name)
+                finally:
+                    size = await self._run_io(writers.close)
+            except BaseException:
+                await self._run_io(writers.discard)
+                raise
         
-        logger.info(f"Appended {len(logs)} logs to {csv_file} (total file size: {csv_file.stat().st_size / 1024 / 1024:.2f} MB)")
-        return csv_file
+        logger.info(f"Exported {exported} {spec.noun} to {writers.file_count} partition files under {root} ({size / 1024 / 1024:.2f} MB)")
+        return exported, writers
     
-    async def _export_metrics_to_file(self, metrics: List[asyncpg.Record]):
+    async def _copy_to_csv(self, conn: asyncpg.Connection, fd: int, header: bool, query: str, *args) -> Tuple[int, int]:
         """
-        Export metrics to a single persistent CSV file (append mode)
+        Write a query's rows to a CSV file descriptor with COPY ... TO
+        STDOUT, so rows stream from the server straight into the file
+        without being built as Python objects. COPY chunks are buffered up
+        to CSV_WRITE_BUFFER_SIZE and written with writev() from a worker
+        thread, without joining them first.
+        
+        Args:
+            fd: Descriptor to write to
+            header: Whether to start with a CSV header
         
         Returns:
-            Path to the metrics CSV file
+            Number of rows exported and number of bytes written
         """
-        # Single persistent file for all metrics
-        csv_file = self.export_dir / "metrics.csv"
+        pending: List[bytes] = []
+        pending_size = 0
+        written = 0
         
-        # Parse JSON fields and flatten
-        metrics_data = []
-        for m in metrics:
-            try:
-                # Extract JSONB columns (already parsed as dicts by asyncpg)
-                cpu_data = m['cpu_data'] if isinstance(m['cpu_data'], dict) else {}
-                memory_data = m['memory_data'] if isinstance(m['memory_data'], dict) else {}
-                disk_data = m['disk_data'] if isinstance(m['disk_data'], dict) else {}
-                network_data = m['network_data'] if isinstance(m['network_data'], dict) else {}
-                process_data = m['process_data'] if isinstance(m['process_data'], dict) else {}
-                
-                metrics_data.append({
-                    'id': m['id'],
-                    'agent_id': str(m['agent_id']),
-                    'timestamp': m['timestamp'].isoformat() if m.get('timestamp') else None,
-                    'cpu_percent': cpu_data.get('cpu_percent'),
-                    'cpu_count': cpu_data.get('cpu_count'),
-                    'memory_percent': memory_data.get('memory_percent'),
-                    'memory_available': memory_data.get('memory_available'),
-                    'memory_total': memory_data.get('memory_total'),
-                    'disk_percent': disk_data.get('disk_percent') or disk_data.get('percent'),
-                    'disk_used': disk_data.get('disk_used') or disk_data.get('used'),
-                    'disk_total': disk_data.get('disk_total') or disk_data.get('total'),
-                    'network_bytes_sent': network_data.get('bytes_sent'),
-                    'network_bytes_recv': network_data.get('bytes_recv'),
-                    'process_count': process_data.get('process_count') or process_data.get('total'),
-                    'process_running': process_data.get('running'),
-                    'exported_at': datetime.now(timezone.utc).isoformat(),
-                })
-            except Exception as e:
-                logger.warning(f"Failed to parse metric {m['id']}: {e}")
-                continue
-        
-        # Create DataFrame
-        df = pd.DataFrame(metrics_data)
-        
-        # Append to existing file (or create new with header)
-        file_exists = csv_file.exists()
-        df.to_csv(csv_file, mode='a', header=not file_exists, index=False)
-        
-        logger.info(f"Appended {len(metrics)} metrics to {csv_file} (total file size: {csv_file.stat().st_size / 1024 / 1024:.2f} MB)")
-        return csv_file
-    
-    async def _export_processes_to_file(self, processes: List[asyncpg.Record]):
-        """
-        Export process data to a single persistent CSV file (append mode)
+        async def write(data: bytes):
+            nonlocal pending, pending_size, written
+            pending.append(data)
+            pending_size += len(data)
+            written += len(data)
+            if pending_size >= CSV_WRITE_BUFFER_SIZE:
+                chunks, pending, pending_size = pending, [], 0
+                await self._run_io(_writev_all, fd, chunks)
         
-        Returns:
-            Path to the processes CSV file
+        status = await conn.copy_from_query(
+            query, *args, output=write, format='csv', header=header
+        )
+        if pending:
+            await self._run_io(_writev_all, fd, pending)
+        
+        # Extract count from "COPY X" string
+        exported = int(status.split()[-1]) if status and status.startswith('COPY') else 0
+        return exported, written
+    
+    async def _run_io(self, func, *args, **kwargs):
+        """Run a blocking export write in the export I/O threads"""
+        return await asyncio.get_running_loop().run_in_executor(self._io_pool, partial(func, *args, **kwargs))
+    
+    def _csv_fd(self, csv_file: Path) -> int:
+        """Append-only descriptor of a CSV export, opened once"""
+        if csv_file not in self._csv_fds:
+            self._csv_fds[csv_file] = os.open(csv_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._csv_fds[csv_file]
+    
+    def close(self):
+        """Let in-flight export writes finish, then close the CSV export descriptors"""
+        self._io_pool.shutdown(wait=True)
+        for fd in self._csv_fds.values():
+            os.close(fd)
+        self._csv_fds.clear()
+    
+    def export_path(self, data_type: str) -> Path:
+        """Path of a data type's export: Parquet dataset directory or CSV file"""
+        if self.format == "csv":
+            return self.export_dir / f"{data_type}.csv"
+        return self.export_dir / data_type
+    
+    def export_files(self, data_type: str) -> List[Path]:
+        """Files that make up a data type's export"""
+        path = self.export_path(data_type)
+        if self.format == "csv":
+            return [path] if path.exists() else []
+        return sorted(path.rglob("*.parquet")) if path.is_dir() else []
+    
+    def exported_row_count(self, data_type: str) -> int:
+        """Number of exported rows, read from Parquet footers (no data scan)"""
+        return sum(pq.ParquetFile(f).metadata.num_rows for f in self.export_files(data_type))
+    
+    def read_export(
+        self,
+        data_type: str,
+        agent_id: Optional[str] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+    ) -> pa.Table:
+        """
+        Read an export, keeping only rows matching the agent/time filters
+        (blocking).
+        
+        Parquet exports push the filters down to the scan: agent and date
+        filters prune whole partition directories, and within a partition,
+        non-matching row groups are skipped using their statistics. Legacy
+        CSV exports are parsed with Arrow's multithreaded CSV reader and
+        filtered in memory.
         """
-        # Single persistent file for all processes
-        csv_file = self.export_dir / "processes.csv"
+        spec = EXPORT_SPECS[data_type]
         
-        processes_data = []
-        for p in processes:
-            processes_data.append({
-                'id': p['id'],
-                'agent_id': str(p['agent_id']),
-                'name': p['name'],
-                'pid': p['pid'],
-                'cpu_percent': p['cpu_percent'],
-                'memory_percent': p['memory_percent'],
-                'status': p['status'],
-                'cmdline': p['cmdline'],
-                'username': p['username'],
-                'collected_at': p['collected_at'].isoformat() if p['collected_at'] else None,
-                'exported_at': datetime.now(timezone.utc).isoformat(),
-            })
+        time_col = ds.field(spec.time_column)
+        conditions = []
+        partition_conditions = []
+        if agent_id:
+            conditions.append(ds.field("agent_id") == agent_id)
+        if start_time:
+            partition_conditions.append(ds.field("date") >= pa.scalar(_utc_date(start_time), type=pa.date32()))
+            conditions.append(time_col >= pa.scalar(start_time, type=_TS))
+        if end_time:
+            partition_conditions.append(ds.field("date") <= pa.scalar(_utc_date(end_time), type=pa.date32()))
+            conditions.append(time_col <= pa.scalar(end_time, type=_TS))
         
-        # Create DataFrame
-        df = pd.DataFrame(processes_data)
+        if self.format == "csv":
+            table = pa_csv.read_csv(self.export_path(data_type), convert_options=_csv_convert_options(spec.schema))
+            expression = _all_of(conditions)
+            return table if expression is None else table.filter(expression)
         
-        # Append to existing file (or create new with header)
-        file_exists = csv_file.exists()
-        df.to_csv(csv_file, mode='a', header=not file_exists, index=False)
+        dataset = ds.dataset(
+            self.export_path(data_type),
+            schema=pa.schema([*spec.file_schema(), *PARTITION_SCHEMA]),
+            format="parquet",
+            partitioning=PARTITIONING,
+        )
         
-        logger.info(f"Appended {len(processes)} processes to {csv_file} (total file size: {csv_file.stat().st_size / 1024 / 1024:.2f} MB)")
-        return csv_file
+        # Back to the export's column order, without the derived date column
+        return dataset.to_table(filter=_all_of(partition_conditions + conditions)).select(spec.schema.names)
     
-    async def _export_commands_to_file(self, commands: List[asyncpg.Record]):
+    async def initialize(self):
+        """
+        Create the export tracking table and restore the last export's time
+        and row counts from it, so they survive restarts
         """
-        Export commands to a single persistent CSV file (append mode)
-        
-        Returns:
-            Path to the commands CSV file
-        """
-        # Single persistent file for all commands
-        csv_file = self.export_dir / "commands.csv"
-        
-        commands_data = []
-        for c in commands:
-            commands_data.append({
-                'id': c['id'],
-                'agent_id': str(c['agent_id']),
-                'command': c['command'],
-                'user_name': c['user_name'],
-                'timestamp': c['timestamp'].isoformat() if c['timestamp'] else None,
-                'shell': c['shell'],
-                'working_directory': c['working_directory'],
-                'exit_code': c['exit_code'],
-                'exported_at': datetime.now(timezone.utc).isoformat(),
-            })
-        
-        # Create DataFrame
-        df = pd.DataFrame(commands_data)
-        
-        # Append to existing file (or create new with header)
-        file_exists = csv_file.exists()
-        df.to_csv(csv_file, mode='a', header=not file_exists, index=False)
-        
-        logger.info(f"Appended {len(commands)} commands to {csv_file} (total file size: {csv_file.stat().st_size / 1024 / 1024:.2f} MB)")
-        return csv_file
-    
-    async def _update_export_tracking(self, data_type: str, last_id: int, count: int):
-        """Update export tracking table"""
         async with self.pool.acquire() as conn:
-            # Create tracking table if not exists
             await conn.execute("""
                 CREATE TABLE IF NOT EXISTS export_tracking (
                     data_type VARCHAR(50) PRIMARY KEY,
                     last_exported_id BIGINT NOT NULL,
+                    last_exported_timestamp TIMESTAMP WITH TIME ZONE,
                     last_export_time TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    total_exported BIGINT DEFAULT 0
-                )
+                    total_exported BIGINT DEFAULT 0,
+                    last_export_count BIGINT DEFAULT 0
+                );
+                ALTER TABLE export_tracking
+                    ADD COLUMN IF NOT EXISTS last_exported_timestamp TIMESTAMP WITH TIME ZONE,
+                    ADD COLUMN IF NOT EXISTS last_export_count BIGINT DEFAULT 0;
             """)
             
-            # Update tracking
-            await conn.execute("""
-                INSERT INTO export_tracking (data_type, last_exported_id, total_exported)
-                VALUES ($1, $2, $3)
-                ON CONFLICT (data_type)
-                DO UPDATE SET
-                    last_exported_id = $2,
-                    last_export_time = CURRENT_TIMESTAMP,
-                    total_exported = export_tracking.total_exported + $3
-            """, data_type, last_id, count)
+            rows = await conn.fetch(
+                "SELECT data_type, last_export_time, last_export_count FROM export_tracking"
+            )
+        
+        for row in rows:
+            if row["data_type"] in self.last_export_counts:
+                self.last_export_counts[row["data_type"]] = row["last_export_count"] or 0
+        export_times = [row["last_export_time"] for row in rows if row["last_export_time"]]
+        if export_times:
+            self.last_export_time = max(export_times)
+    
+    async def _export_labeled_source(
+        self,
+        path: Path,
+        table: str,
+        time_column: str,
+        device_id: UUID,
+        start_time: datetime,
+        end_time: datetime
+    ) -> int:
+        """
+        Export one device's rows of a table within a time range to
+        <path>.csv or <path>.parquet. No file is left when there are none.
+        
+        Returns:
+            Number of rows exported
+        """
+        query = f"""
+            SELECT * FROM {table}
+            WHERE agent_id = $1 AND {time_column} BETWEEN $2 AND $3
+            ORDER BY {time_column}
+        """
+        
+        async with self.pool.acquire() as conn:
+            if self.format == "csv":
+                # Stream straight to disk; nothing is held in memory
+                csv_file = path.with_name(f"{path.name}.csv")
+                fd = os.open(csv_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                try:
+                    count, _ = await self._copy_to_csv(
+                        conn, fd, True, query, device_id, start_time, end_time
+                    )
+                finally:
+                    os.close(fd)
+                if not count:
+                    csv_file.unlink()
+                return count
+            
+            # Stream through a cursor into an incremental Parquet writer, one
+            # row group per batch, so memory stays flat however long the range
+            statement = await conn.prepare(query)
+            schema = _query_schema(statement)
+            writer = None
+            count = 0
+            try:
+                async with conn.transaction():
+                    cursor = await statement.cursor(device_id, start_time, end_time)
+                    while rows := await cursor.fetch(LABELED_BATCH_SIZE):
+                        if writer is None:
+                            writer = await self._run_io(
+                                pq.ParquetWriter, path.with_name(f"{path.name}.parquet"), schema, **PARQUET_OPTIONS
+                            )
+                        await self._run_io(_write_records, writer, schema, rows)
+                        count += len(rows)
+            finally:
+                if writer is not None:
+                    await self._run_io(writer.close)
+        
+        return count
     
     async def export_labeled_dataset(
         self,
@@ -575,46 +1163,16 @@ class DataExporter:
         label_dir = self.export_dir / "labeled" / label
         label_dir.mkdir(parents=True, exist_ok=True)
         
-        async with self.pool.acquire() as conn:
-            # Export logs
-            logs = await conn.fetch(
-                """
-                SELECT * FROM logs
-                WHERE agent_id = $1 AND timestamp BETWEEN $2 AND $3
-                ORDER BY timestamp
-                """,
-                device_id, start_time, end_time
-            )
-            
-            # Export metrics
-            metrics = await conn.fetch(
-                """
-                SELECT * FROM system_metrics
-                WHERE agent_id = $1 AND timestamp BETWEEN $2 AND $3
-                ORDER BY timestamp
-                """,
-                device_id, start_time, end_time
-            )
-            
-            # Export commands
-            commands = await conn.fetch(
-                """
-                SELECT * FROM commands
-                WHERE agent_id = $1 AND timestamp BETWEEN $2 AND $3
-                ORDER BY timestamp
-                """,
-                device_id, start_time, end_time
-            )
-            
-            # Export processes
-            processes = await conn.fetch(
-                """
-                SELECT * FROM processes
-                WHERE agent_id = $1 AND collected_at BETWEEN $2 AND $3
-                ORDER BY collected_at
-                """,
-                device_id, start_time, end_time
+        # The sources are disjoint tables written to disjoint files, so
+        # export them concurrently, one pooled connection each
+        prefix = f"{label}_{timestamp}"
+        exported = await asyncio.gather(*(
+            self._export_labeled_source(
+                label_dir / f"{prefix}_{name}", table, time_column, device_id, start_time, end_time
             )
+            for name, (table, time_column) in LABELED_SOURCES.items()
+        ))
+        counts = dict(zip(LABELED_SOURCES, exported, strict=True))
         
         # Save metadata
         metadata = {
@@ -624,37 +1182,14 @@ class DataExporter:
             "start_time": start_time.isoformat(),
             "end_time": end_time.isoformat(),
             "exported_at": datetime.now(timezone.utc).isoformat(),
-            "counts": {
-                "logs": len(logs),
-                "metrics": len(metrics),
-                "commands": len(commands),
-                "processes": len(processes),
-            }
+            "counts": counts,
         }
         
-        metadata_file = label_dir / f"{label}_{timestamp}_metadata.json"
-        with open(metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        
-        # Export data files
-        if logs:
-            df = pd.DataFrame([dict(r) for r in logs])
-            df.to_csv(label_dir / f"{label}_{timestamp}_logs.csv", index=False)
-        
-        if metrics:
-            df = pd.DataFrame([dict(r) for r in metrics])
-            df.to_csv(label_dir / f"{label}_{timestamp}_metrics.csv", index=False)
-        
-        if commands:
-            df = pd.DataFrame([dict(r) for r in commands])
-            df.to_csv(label_dir / f"{label}_{timestamp}_commands.csv", index=False)
-        
-        if processes:
-            df = pd.DataFrame([dict(r) for r in processes])
-            df.to_csv(label_dir / f"{label}_{timestamp}_processes.csv", index=False)
+        metadata_file = label_dir / f"{prefix}_metadata.json"
+        await self._run_io(metadata_file.write_text, json.dumps(metadata, indent=2))
         
         logger.info(f"Exported labeled dataset '{label}' to {label_dir}")
-        logger.info(f"  Logs: {len(logs)}, Metrics: {len(metrics)}, Commands: {len(commands)}, Processes: {len(processes)}")
+        logger.info(f"  Logs: {counts['logs']}, Metrics: {counts['metrics']}, Commands: {counts['commands']}, Processes: {counts['processes']}")
         
         return metadata_file
 
@@ -668,8 +1203,9 @@ def get_data_exporter() -> Optional[DataExporter]:
     return _exporter
 
 
-def init_data_exporter(pool: asyncpg.Pool, export_dir: str = "./ml_data"):
+async def init_data_exporter(pool: asyncpg.Pool, export_dir: str = "./ml_data"):
     """Initialize the global data exporter"""
     global _exporter
     _exporter = DataExporter(pool, export_dir)
+    await _exporter.initialize()
     return _exporter
@@ -6,13 +6,144 @@ in system behavior and generates alerts for suspicious activity.
 """
 
 import asyncio
-import json
+import logging
+import time
 import uuid
 from datetime import datetime, timedelta, UTC
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+
+from cachetools import TTLCache
 
 from internal.ml.anomaly_detector import AnomalyDetector
 
+logger = logging.getLogger(__name__)
+
+
+# Feature aggregates of the agents $1 over the window [$2, $3), matching the
+# training pipeline: one row per agent, each source table scanned once for
+# all of them. Agents without data in a table aggregate to 0.
+FEATURES_SQL = """
+    WITH m AS (
+        SELECT 
+            agent_id,
+            AVG(cpu_percent) as avg_cpu,
+            AVG(memory_percent) as avg_memory,
+            AVG(disk_percent) as avg_disk,
+            AVG(net_bytes_sent) / 1048576.0 as avg_net_sent,
+            AVG(net_bytes_recv) / 1048576.0 as avg_net_recv
+        FROM system_metrics
+        WHERE agent_id = ANY($1::uuid[]) 
+        AND timestamp >= $2 
+        AND timestamp < $3
+        GROUP BY agent_id
+    ),
+    p AS (
+        SELECT 
+            agent_id,
+            COUNT(DISTINCT name) as process_count,
+            MAX(cpu_percent) as max_cpu,
+            MAX(memory_percent) as max_memory
+        FROM processes
+        WHERE agent_id = ANY($1::uuid[]) 
+        AND collected_at >= $2 
+        AND collected_at < $3
+        GROUP BY agent_id
+    ),
+    c AS (
+        SELECT 
+            agent_id,
+            COUNT(*) as command_count,
+            COUNT(*) FILTER (WHERE command LIKE 'sudo %') as sudo_count
+        FROM commands
+        WHERE agent_id = ANY($1::uuid[]) 
+        AND timestamp >= $2 
+        AND timestamp < $3
+        GROUP BY agent_id
+    ),
+    l AS (
+        SELECT 
+            agent_id,
+            COUNT(*) as log_count,
+            COUNT(*) FILTER (WHERE severity IN ('error', 'critical')) as error_count
+        FROM logs
+        WHERE agent_id = ANY($1::uuid[]) 
+        AND timestamp >= $2 
+        AND timestamp < $3
+        GROUP BY agent_id
+    )
+    SELECT 
+        a.agent_id,
+        COALESCE(m.avg_cpu, 0) as avg_cpu,
+        COALESCE(m.avg_memory, 0) as avg_memory,
+        COALESCE(m.avg_disk, 0) as avg_disk,
+        COALESCE(m.avg_net_sent, 0) as avg_net_sent,
+        COALESCE(m.avg_net_recv, 0) as avg_net_recv,
+        COALESCE(p.process_count, 0) as process_count,
+        COALESCE(p.max_cpu, 0) as max_cpu,
+        COALESCE(p.max_memory, 0) as max_memory,
+        COALESCE(c.command_count, 0) as command_count,
+        COALESCE(c.sudo_count, 0) as sudo_count,
+        COALESCE(l.log_count, 0) as log_count,
+        COALESCE(l.error_count, 0) as error_count
+    FROM unnest($1::uuid[]) AS a(agent_id)
+    LEFT JOIN m USING (agent_id)
+    LEFT JOIN p USING (agent_id)
+    LEFT JOIN c USING (agent_id)
+    LEFT JOIN l USING (agent_id)
+"""
+
+# Detection cadence (seconds). Cycles are skipped while no metrics arrive;
+# a new_metrics notification then starts the next cycle, limited to the
+# devices that reported. Without any notification for a full sweep interval,
+# all devices are checked.
+DETECTION_INTERVAL = 600
+FULL_SWEEP_INTERVAL = 3600
+
+# Channel notified by the system_metrics insert trigger (see init_db)
+NEW_METRICS_CHANNEL = 'new_metrics'
+
+# Online devices seen since $1, optionally limited to the agents $2
+ACTIVE_DEVICES_SQL = """
+    SELECT agent_id, hostname 
+    FROM devices 
+    WHERE last_seen >= $1 
+    AND status = 'online'
+    AND ($2::uuid[] IS NULL OR agent_id = ANY($2::uuid[]))
+    ORDER BY last_seen DESC
+"""
+
+# Devices per feature query and prediction batch, and how many additional
+# batches run at once on their own pooled connections in large fleets
+DETECTION_BATCH_SIZE = 200
+DETECTION_CONCURRENCY = 4
+
+# Upper bound on the devices whose last detection time is remembered
+MAX_TRACKED_DEVICES = 10000
+
+# How long a device's hostname is reused before the active-devices query
+# runs again, so renamed and removed devices are picked up. Cycles are at
+# most DETECTION_INTERVAL + FULL_SWEEP_INTERVAL apart, so entries cached by
+# one cycle are still there for the next
+HOSTNAME_CACHE_SECONDS = DETECTION_INTERVAL + FULL_SWEEP_INTERVAL
+
+# Suppress repeated ML alerts of the same rule and severity for an agent
+# within this window. Must match the bucket width of the idx_alerts_ml_dedup
+# unique index (init_db.py)
+ALERT_DEDUP_SECONDS = 30 * 60
+
+# Insert ML alerts from parallel arrays, skipping agents that already have one
+# of the same rule and severity in the current 30 minute bucket; returns a
+# row only for the alerts inserted
+INSERT_ALERTS_SQL = """
+    INSERT INTO alerts (rule_name, severity, details, agent_id, created_at)
+    SELECT * FROM unnest($1::text[], $2::text[], $3::jsonb[], $4::uuid[], $5::timestamptz[])
+    ON CONFLICT (agent_id, rule_name, severity,
+                 (floor(extract(epoch FROM created_at AT TIME ZONE 'UTC') / 1800)))
+        WHERE rule_name LIKE 'ML Anomaly Detection%'
+    DO NOTHING
+    RETURNING id, agent_id
+"""
+
 
 class MLDetectionService:
     """Service to run ML anomaly detection and generate alerts"""
@@ -21,20 +152,35 @@ class MLDetectionService:
         self.db_pool = db_pool
         self.model_dir = model_dir
         self.detector: Optional[AnomalyDetector] = None
-        self.last_detection_time: Dict[str, datetime] = {}
+        # Detection time of each device checked within the last hour (the
+        # detection window); entries expire with the window, so devices
+        # that go away don't linger
+        self.last_detection_time: TTLCache = TTLCache(maxsize=MAX_TRACKED_DEVICES, ttl=3600)
+        # (agent_id, rule_name, severity) -> monotonic time until which
+        # further alerts of that kind are duplicates
+        self._dedup: Dict[Tuple[uuid.UUID, str, str], float] = {}
+        # Hostnames of the devices seen by recent cycles
+        self._hostnames: TTLCache = TTLCache(maxsize=MAX_TRACKED_DEVICES, ttl=HOSTNAME_CACHE_SECONDS)
+        # Statements prepared on the detection loop's connection, by SQL
+        self._statements: Dict[str, object] = {}
+        self._statements_conn = None
         
     async def initialize(self):
-        """Initialize the ML detector by loading the model"""
+        """
+        Initialize the ML detector by loading the model. The model files are
+        read in a worker thread so loading doesn't block the event loop.
+        """
         try:
-            self.detector = AnomalyDetector(model_dir=self.model_dir)
-            self.detector.load_model()
-            print("✅ ML Detector initialized successfully")
+            self.detector = await asyncio.to_thread(AnomalyDetector, model_dir=self.model_dir)
             model_info = self.detector.get_model_info()
-            print(f"   Algorithm: {model_info.get('algorithm', 'IsolationForest')}")
-            print(f"   Features: {len(model_info.get('features', []))}")
-            print(f"   Trained: {model_info.get('trained_at', 'Unknown')[:19]}")
+            logger.info(
+                "ML Detector initialized (algorithm: %s, features: %d, trained: %s)",
+                model_info.get('algorithm', 'IsolationForest'),
+                len(model_info.get('features', [])),
+                model_info.get('trained_at', 'Unknown')[:19]
+            )
         except Exception as e:
-            print(f"❌ Failed to initialize ML detector: {e}")
+            logger.error("Failed to initialize ML detector: %s", e)
             self.detector = None
     
     async def extract_features_from_db(self, agent_id: uuid.UUID, 
@@ -45,144 +191,112 @@ class MLDetectionService:
         
         This mirrors the feature extraction from the ML training pipeline.
         """
+        async with self.db_pool.acquire() as conn:
+            features = await self.extract_features_for_devices(conn, [agent_id], start_time, end_time)
+        return features[agent_id] if features else None
+    
+    async def extract_features_for_devices(self, conn,
+                                           agent_ids: List[uuid.UUID], 
+                                           start_time: datetime, 
+                                           end_time: datetime) -> Optional[Dict[uuid.UUID, Dict]]:
+        """
+        Extract features of several devices for the same time window with a
+        single query, grouped by agent.
+        
+        Args:
+            conn: Connection acquired by the caller for the detection cycle
+            agent_ids: Devices to extract features for
+            start_time: Window start (inclusive)
+            end_time: Window end (exclusive)
+        
+        Returns:
+            Features by agent_id, or None if the query failed
+        """
         try:
-            async with self.db_pool.acquire() as conn:
-                # Extract features matching the training pipeline
-                features = {}
-                
-                # 1. Temporal features
-                features['hour'] = end_time.hour
-                features['day_of_week'] = end_time.weekday()
-                features['is_weekend'] = 1 if end_time.weekday() >= 5 else 0
-                
-                # 2. System metrics features
-                metrics = await conn.fetchrow("""
-                    SELECT 
-                        AVG(cpu_percent) as avg_cpu,
-                        AVG(memory_percent) as avg_memory,
-                        AVG(disk_percent) as avg_disk,
-                        AVG(network_mb_sent) as avg_net_sent,
-                        AVG(network_mb_recv) as avg_net_recv
-                    FROM metrics
-                    WHERE agent_id = $1 
-                    AND timestamp >= $2 
-                    AND timestamp < $3
-                """, agent_id, start_time, end_time)
-                
-                if metrics:
-                    features['cpu_percent'] = float(metrics['avg_cpu'] or 0)
-                    features['memory_percent'] = float(metrics['avg_memory'] or 0)
-                    features['disk_percent'] = float(metrics['avg_disk'] or 0)
-                    features['network_mb_sent'] = float(metrics['avg_net_sent'] or 0)
-                    features['network_mb_recv'] = float(metrics['avg_net_recv'] or 0)
-                else:
-                    # No metrics found, use defaults
-                    features.update({
-                        'cpu_percent': 0.0,
-                        'memory_percent': 0.0,
-                        'disk_percent': 0.0,
-                        'network_mb_sent': 0.0,
-                        'network_mb_recv': 0.0
-                    })
-                
-                # 3. Process features
-                processes = await conn.fetchrow("""
-                    SELECT 
-                        COUNT(DISTINCT name) as process_count,
-                        MAX(cpu_percent) as max_cpu,
-                        MAX(memory_percent) as max_memory
-                    FROM processes
-                    WHERE agent_id = $1 
-                    AND timestamp >= $2 
-                    AND timestamp < $3
-                """, agent_id, start_time, end_time)
-                
-                if processes:
-                    features['process_count'] = int(processes['process_count'] or 0)
-                    features['max_process_cpu'] = float(processes['max_cpu'] or 0)
-                    features['max_process_memory'] = float(processes['max_memory'] or 0)
-                else:
-                    features.update({
-                        'process_count': 0,
-                        'max_process_cpu': 0.0,
-                        'max_process_memory': 0.0
-                    })
-                
-                # 4. Command features
-                commands = await conn.fetchrow("""
-                    SELECT 
-                        COUNT(*) as command_count,
-                        SUM(CASE WHEN command LIKE 'sudo %' THEN 1 ELSE 0 END) as sudo_count
-                    FROM commands
-                    WHERE agent_id = $1 
-                    AND timestamp >= $2 
-                    AND timestamp < $3
-                """, agent_id, start_time, end_time)
-                
-                if commands:
-                    features['command_count'] = int(commands['command_count'] or 0)
-                    features['sudo_count'] = int(commands['sudo_count'] or 0)
-                else:
-                    features.update({
-                        'command_count': 0,
-                        'sudo_count': 0
-                    })
-                
-                # 5. Log features
-                logs = await conn.fetchrow("""
-                    SELECT 
-                        COUNT(*) as log_count,
-                        SUM(CASE WHEN severity IN ('error', 'critical') THEN 1 ELSE 0 END) as error_count
-                    FROM logs
-                    WHERE agent_id = $1 
-                    AND timestamp >= $2 
-                    AND timestamp < $3
-                """, agent_id, start_time, end_time)
-                
-                if logs:
-                    features['log_count'] = int(logs['log_count'] or 0)
-                    features['error_count'] = int(logs['error_count'] or 0)
-                else:
-                    features.update({
-                        'log_count': 0,
-                        'error_count': 0
-                    })
-                
-                return features
-                
+            rows = await self._fetch(conn, FEATURES_SQL, agent_ids, start_time, end_time)
+            
+            return {row['agent_id']: self._features_from_row(row, end_time) for row in rows}
+            
         except Exception as e:
-            print(f"Error extracting features: {e}")
+            logger.error("Error extracting features: %s", e)
             return None
     
-    async def generate_alert(self, agent_id: uuid.UUID, 
+    @staticmethod
+    def _features_from_row(row, end_time: datetime) -> Dict:
+        """Build the feature dict of one agent's FEATURES_SQL row"""
+        features = {}
+        
+        # 1. Temporal features
+        features['hour'] = end_time.hour
+        features['day_of_week'] = end_time.weekday()
+        features['is_weekend'] = 1 if end_time.weekday() >= 5 else 0
+        
+        # 2. System metrics features
+        features['cpu_percent'] = float(row['avg_cpu'])
+        features['memory_percent'] = float(row['avg_memory'])
+        features['disk_percent'] = float(row['avg_disk'])
+        features['network_mb_sent'] = float(row['avg_net_sent'])
+        features['network_mb_recv'] = float(row['avg_net_recv'])
+        
+        # 3. Process features
+        features['process_count'] = int(row['process_count'])
+        features['max_process_cpu'] = float(row['max_cpu'])
+        features['max_process_memory'] = float(row['max_memory'])
+        
+        # 4. Command features
+        features['command_count'] = int(row['command_count'])
+        features['sudo_count'] = int(row['sudo_count'])
+        
+        # 5. Log features
+        features['log_count'] = int(row['log_count'])
+        features['error_count'] = int(row['error_count'])
+        
+        return features
+    
+    @staticmethod
+    def _rule_name(severity: str) -> str:
+        """Alert rule name of an ML anomaly of the given severity"""
+        return f"ML Anomaly Detection - {severity.upper()}"
+    
+    def _is_duplicate(self, agent_id: uuid.UUID, severity: str) -> bool:
+        """Whether an ML alert of this severity for the agent is currently suppressed"""
+        return self._dedup.get((agent_id, self._rule_name(severity), severity), 0) > time.monotonic()
+    
+    async def generate_alert(self, conn,
+                           agent_id: uuid.UUID, 
                            anomaly_score: float, 
                            severity: str,
                            features: Dict,
                            contributions: Dict):
         """Generate an alert in the database for detected anomaly"""
+        alert_ids = await self.generate_alerts(
+            conn, [(agent_id, anomaly_score, severity, features, contributions)]
+        )
+        return alert_ids.get(agent_id)
+    
+    async def generate_alerts(self, conn, anomalies: List[Tuple]) -> Dict[uuid.UUID, int]:
+        """
+        Generate alerts for several detected anomalies with a single INSERT
+        
+        Args:
+            conn: Connection acquired by the caller for the detection cycle
+            anomalies: (agent_id, anomaly_score, severity, features,
+                contributions) tuples, at most one per agent
+        
+        Returns:
+            Alert IDs by agent_id of the alerts inserted
+        """
         try:
-            async with self.db_pool.acquire() as conn:
+            pending = []
+            for agent_id, anomaly_score, severity, features, contributions in anomalies:
                 # Create detailed alert message
-                rule_name = f"ML Anomaly Detection - {severity.upper()}"
+                rule_name = self._rule_name(severity)
                 
                 # Deduplication: Check for similar alert in last 30 minutes
                 # This prevents spam from repeated alerts (e.g., vscode high CPU usage)
-                dedup_window = datetime.now(UTC) - timedelta(minutes=30)
-                existing_alert = await conn.fetchrow("""
-                    SELECT id FROM alerts
-                    WHERE rule_name = $1 
-                    AND severity = $2 
-                    AND agent_id = $3
-                    AND created_at >= $4
-                    ORDER BY created_at DESC 
-                    LIMIT 1
-                """, rule_name, severity, agent_id, dedup_window)
-                
-                if existing_alert:
-                    print(f"⚠️  Suppressed duplicate ML alert for device {agent_id}")
-                    print(f"   Rule: {rule_name}, Severity: {severity}")
-                    print(f"   (Similar alert exists: ID {existing_alert['id']})")
-                    return None
+                if self._is_duplicate(agent_id, severity):
+                    logger.info("Suppressed duplicate ML alert for device %s (rule: %s)", agent_id, rule_name)
+                    continue
                 
                 # Build details with top contributing features
                 top_features = sorted(
@@ -207,131 +321,235 @@ class MLDetectionService:
                     "all_features": {k: round(v, 2) if isinstance(v, float) else v 
                                    for k, v in features.items()}
                 }
+                pending.append((agent_id, anomaly_score, severity, rule_name, details, top_features))
+            
+            if not pending:
+                return {}
+            
+            # Insert all alerts in one statement; details go through the
+            # pool's orjson JSONB codec. Duplicates not known in memory (e.g.
+            # after a restart) are suppressed by the dedup unique index
+            created_at = datetime.now(UTC)
+            rows = await self._fetch(
+                conn,
+                INSERT_ALERTS_SQL,
+                [rule_name for _, _, _, rule_name, _, _ in pending],
+                [severity for _, _, severity, _, _, _ in pending],
+                [details for _, _, _, _, details, _ in pending],
+                [agent_id for agent_id, _, _, _, _, _ in pending],
+                [created_at] * len(pending)
+            )
+            alert_ids = {row['agent_id']: row['id'] for row in rows}
+            
+            for agent_id, anomaly_score, severity, rule_name, _, top_features in pending:
+                dedup_key = (agent_id, rule_name, severity)
+                alert_id = alert_ids.get(agent_id)
+                if not alert_id:
+                    # Remember the duplicate until its dedup bucket ends
+                    remaining = ALERT_DEDUP_SECONDS - created_at.timestamp() % ALERT_DEDUP_SECONDS
+                    self._dedup[dedup_key] = time.monotonic() + remaining
+                    logger.info("Suppressed duplicate ML alert for device %s (rule: %s)", agent_id, rule_name)
+                    continue
                 
-                # Insert alert
-                sql = """
-                INSERT INTO alerts (rule_name, severity, details, agent_id, created_at)
-                VALUES ($1, $2, $3, $4, $5)
-                RETURNING id
-                """
-                
-                result = await conn.fetchrow(
-                    sql,
-                    rule_name,
-                    severity,
-                    json.dumps(details),
-                    agent_id,
-                    datetime.now(UTC)
+                self._dedup[dedup_key] = time.monotonic() + ALERT_DEDUP_SECONDS
+                top_feature, top_contribution = top_features[0] if top_features else (None, 0.0)
+                logger.info(
+                    "Generated ML alert (ID: %s) for device %s: score %.3f, severity %s, "
+                    "top feature %s (contribution: %.3f)",
+                    alert_id, agent_id, anomaly_score, severity, top_feature, top_contribution
                 )
-                
-                if result:
-                    print(f"✅ Generated ML alert (ID: {result['id']}) for device {agent_id}")
-                    print(f"   Score: {anomaly_score:.3f}, Severity: {severity}")
-                    print(f"   Top feature: {top_features[0][0]} (contribution: {top_features[0][1]:.3f})")
-                    return result['id']
-                
+            
+            return alert_ids
+            
         except Exception as e:
-            print(f"Error generating alert: {e}")
-            return None
+            logger.error("Error generating alerts: %s", e)
+            return {}
     
     async def detect_anomalies_for_device(self, agent_id: uuid.UUID) -> bool:
         """Run anomaly detection for a specific device"""
+        async with self.db_pool.acquire() as conn:
+            return agent_id in await self.detect_anomalies_for_devices(conn, [agent_id])
+    
+    async def detect_anomalies_for_devices(self, conn,
+                                           agent_ids: List[uuid.UUID]) -> List[uuid.UUID]:
+        """
+        Run anomaly detection for several devices at once: one feature query
+        and one batched model prediction for all of them. All queries run on
+        the caller's connection.
+        
+        Returns:
+            The devices an alert was generated for
+        """
         if not self.detector:
-            return False
+            return []
         
         try:
-            # Get last detection time for this device
-            last_time = self.last_detection_time.get(str(agent_id))
             now = datetime.now(UTC)
             
+            # Forget dedup entries whose window has passed
+            current = time.monotonic()
+            self._dedup = {key: until for key, until in self._dedup.items() if until > current}
+            
             # Use last hour as detection window
             end_time = now
             start_time = end_time - timedelta(hours=1)
             
-            # If we've already checked this hour, skip
-            if last_time and last_time >= start_time:
-                return False
+            # Skip devices already checked this hour
+            pending = []
+            for agent_id in agent_ids:
+                if agent_id not in self.last_detection_time:
+                    pending.append(agent_id)
+            if not pending:
+                return []
             
             # Extract features
-            features = await self.extract_features_from_db(agent_id, start_time, end_time)
-            if not features:
-                return False
+            features_by_agent = await self.extract_features_for_devices(
+                conn, pending, start_time, end_time
+            )
+            if not features_by_agent:
+                return []
+            
+            active = []
+            for agent_id, features in features_by_agent.items():
+                # Check if there's any activity (to avoid alerting on idle systems)
+                total_activity = (
+                    features.get('log_count', 0) + 
+                    features.get('command_count', 0) + 
+                    features.get('process_count', 0)
+                )
+                
+                if total_activity < 5:  # Very low activity threshold
+                    # Update last detection time but don't alert
+                    self.last_detection_time[agent_id] = now
+                else:
+                    active.append((agent_id, features))
+            
+            if not active:
+                return []
             
-            # Check if there's any activity (to avoid alerting on idle systems)
-            total_activity = (
-                features.get('log_count', 0) + 
-                features.get('command_count', 0) + 
-                features.get('process_count', 0)
+            # Run prediction for all active devices in one batch, in a worker
+            # thread so scoring doesn't hold up the event loop
+            predictions = await asyncio.to_thread(
+                self.detector.batch_predict, [features for _, features in active]
             )
             
-            if total_activity < 5:  # Very low activity threshold
-                # Update last detection time but don't alert
-                self.last_detection_time[str(agent_id)] = now
-                return False
+            anomalies = []
+            for (agent_id, features), (is_anomaly, score, severity) in zip(
+                active, predictions, strict=True
+            ):
+                if is_anomaly:
+                    # Get feature contributions for explainability
+                    contributions = self.detector.get_feature_contributions(features)
+                    anomalies.append((agent_id, score, severity, features, contributions))
+                else:
+                    # Update last detection time even if no anomaly
+                    self.last_detection_time[agent_id] = now
             
-            # Run prediction
-            is_anomaly, score, severity = self.detector.predict(features)
+            # Generate alerts for all anomalous devices at once
+            alert_ids = await self.generate_alerts(conn, anomalies)
             
-            if is_anomaly:
-                # Get feature contributions for explainability
-                contributions = self.detector.get_feature_contributions(features)
-                
-                # Generate alert
-                alert_id = await self.generate_alert(
-                    agent_id, score, severity, features, contributions
-                )
-                
-                if alert_id:
-                    self.last_detection_time[str(agent_id)] = now
-                    return True
-            else:
-                # Update last detection time even if no anomaly
-                self.last_detection_time[str(agent_id)] = now
+            alerted = []
+            for agent_id, _, severity, _, _ in anomalies:
+                if agent_id in alert_ids:
+                    self.last_detection_time[agent_id] = now
+                    alerted.append(agent_id)
+                elif self._is_duplicate(agent_id, severity):
+                    # Already alerted; don't re-aggregate and re-score
+                    # this device every cycle until its next window
+                    self.last_detection_time[agent_id] = now
             
-            return False
+            return alerted
             
         except Exception as e:
-            print(f"Error detecting anomalies for device {agent_id}: {e}")
-            return False
+            logger.error("Error detecting anomalies for devices: %s", e)
+            return []
     
-    async def run_detection_cycle(self):
-        """Run detection for all active devices"""
-        try:
+    async def prepare(self, conn):
+        """
+        Prepare the detector's statements on a long-lived connection so each
+        cycle run on it skips parse/plan.
+        """
+        self._statements = {}
+        self._statements_conn = conn
+        for sql in (ACTIVE_DEVICES_SQL, FEATURES_SQL, INSERT_ALERTS_SQL):
+            try:
+                self._statements[sql] = await conn.prepare(sql)
+            except Exception as e:
+                # e.g. schema migrations not applied yet; the query then
+                # reports its error when it runs
+                logger.warning("Could not prepare ML detection statement: %s", e)
+    
+    async def _fetch(self, conn, sql: str, *args):
+        """Run a query through its prepared statement when conn has one"""
+        if conn is self._statements_conn and sql in self._statements:
+            return await self._statements[sql].fetch(*args)
+        return await conn.fetch(sql, *args)
+    
+    async def run_detection_cycle(self, agent_ids: Optional[List[uuid.UUID]] = None, conn=None):
+        """
+        Run detection for all active devices
+        
+        Args:
+            agent_ids: Only consider these devices (default: all of them)
+            conn: Connection to run the cycle on (default: one from the pool)
+        """
+        if conn is None:
             async with self.db_pool.acquire() as conn:
+                return await self.run_detection_cycle(agent_ids, conn)
+        
+        try:
+            # Devices that just reported metrics are online by definition
+            # (ingest marks them so); skip the query if their hostnames are
+            # all still cached
+            hostnames = None
+            if agent_ids is not None:
+                hostnames = {agent_id: self._hostnames.get(agent_id) for agent_id in agent_ids}
+                if None in hostnames.values():
+                    hostnames = None
+            if hostnames is None:
                 # Get all active devices (seen in last 2 hours)
                 two_hours_ago = datetime.now(UTC) - timedelta(hours=2)
-                
-                devices = await conn.fetch("""
-                    SELECT agent_id, hostname 
-                    FROM devices 
-                    WHERE last_seen >= $1 
-                    AND status = 'online'
-                    ORDER BY last_seen DESC
-                """, two_hours_ago)
-                
-                if not devices:
-                    print("No active devices found for ML detection")
-                    return
-                
-                print(f"\n🔍 Running ML detection for {len(devices)} active device(s)...")
-                
-                alerts_generated = 0
-                for device in devices:
-                    agent_id = device['agent_id']
-                    hostname = device['hostname']
-                    
-                    detected = await self.detect_anomalies_for_device(agent_id)
-                    if detected:
-                        alerts_generated += 1
-                        print(f"   ⚠️  Anomaly detected on {hostname}")
-                
-                if alerts_generated > 0:
-                    print(f"✅ Generated {alerts_generated} ML alert(s)")
-                else:
-                    print("✅ No anomalies detected")
-                    
+                devices = await self._fetch(conn, ACTIVE_DEVICES_SQL, two_hours_ago, agent_ids)
+                hostnames = {device['agent_id']: device['hostname'] for device in devices}
+                self._hostnames.update(hostnames)
+            
+            if not hostnames:
+                logger.info("No active devices found for ML detection")
+                return
+            
+            logger.info("Running ML detection for %d active device(s)", len(hostnames))
+            
+            agent_ids = list(hostnames)
+            batches = [
+                agent_ids[i:i + DETECTION_BATCH_SIZE]
+                for i in range(0, len(agent_ids), DETECTION_BATCH_SIZE)
+            ]
+            
+            # The first batch runs on this connection; further batches
+            # run concurrently, each on its own pooled connection
+            semaphore = asyncio.Semaphore(DETECTION_CONCURRENCY)
+            
+            async def detect_batch(batch: List[uuid.UUID]) -> List[uuid.UUID]:
+                async with semaphore, self.db_pool.acquire() as batch_conn:
+                    return await self.detect_anomalies_for_devices(batch_conn, batch)
+            
+            results = await asyncio.gather(
+                self.detect_anomalies_for_devices(conn, batches[0]),
+                *(detect_batch(batch) for batch in batches[1:])
+            )
+            alerted = [agent_id for batch_alerted in results for agent_id in batch_alerted]
+            
+            for agent_id in alerted:
+                logger.warning("Anomaly detected on %s", hostnames[agent_id])
+            
+            alerts_generated = len(alerted)
+            if alerts_generated > 0:
+                logger.info("Generated %d ML alert(s)", alerts_generated)
+            else:
+                logger.info("No anomalies detected")
+            
         except Exception as e:
-            print(f"Error in detection cycle: {e}")
+            logger.error("Error in detection cycle: %s", e)
 
 
 # Global instance
@@ -354,34 +572,68 @@ async def run_ml_detection_loop():
     """
     Background task to run ML anomaly detection periodically.
     
-    Runs every 10 minutes to check for anomalies in recent system behavior.
+    Runs every 10 minutes to check for anomalies in recent system behavior,
+    for the devices that sent metrics since the previous cycle. While no
+    metrics arrive, no cycles run.
     """
-    print("Starting ML anomaly detection loop...")
+    logger.info("Starting ML anomaly detection loop...")
     
     # Wait for server to be fully ready
     await asyncio.sleep(60)
     
     service = get_ml_service()
     if not service:
-        print("ML service not initialized, skipping ML detection loop")
+        logger.warning("ML service not initialized, skipping ML detection loop")
         return
     
-    # Initialize the ML detector
-    await service.initialize()
+    # Initialize the ML detector, unless it was already loaded at startup
+    if not service.detector:
+        await service.initialize()
     
     if not service.detector:
-        print("ML detector failed to initialize, exiting detection loop")
+        logger.warning("ML detector failed to initialize, exiting detection loop")
         return
     
-    # Run detection every 10 minutes
     while True:
         try:
-            await service.run_detection_cycle()
-            await asyncio.sleep(600)  # 10 minutes
+            async with service.db_pool.acquire() as conn:
+                # Collect the devices that report metrics between cycles
+                new_metrics = asyncio.Event()
+                reported = set()
+                
+                def on_new_metrics(
+                    connection, pid, channel, payload,
+                    reported=reported, new_metrics=new_metrics,
+                ):
+                    reported.add(uuid.UUID(payload))
+                    new_metrics.set()
+                
+                await conn.add_listener(NEW_METRICS_CHANNEL, on_new_metrics)
+                await service.prepare(conn)
+                try:
+                    # The first cycle after (re)connecting covers all devices
+                    agent_ids = None
+                    while not conn.is_closed():
+                        await service.run_detection_cycle(agent_ids, conn)
+                        await asyncio.sleep(DETECTION_INTERVAL)
+                        
+                        # Wait for the first notification if nothing reported
+                        try:
+                            await asyncio.wait_for(new_metrics.wait(), timeout=FULL_SWEEP_INTERVAL)
+                            agent_ids = list(reported)
+                        except TimeoutError:
+                            # Nothing notified (e.g. trigger not installed
+                            # yet); fall back to sweeping all devices
+                            agent_ids = None
+                        new_metrics.clear()
+                        reported.clear()
+                finally:
+                    if not conn.is_closed():
+                        await conn.remove_listener(NEW_METRICS_CHANNEL, on_new_metrics)
             
         except asyncio.CancelledError:
-            print("ML detection loop cancelled")
+            logger.info("ML detection loop cancelled")
             raise
         except Exception as e:
-            print(f"Error in ML detection loop: {e}")
+            logger.error("Error in ML detection loop: %s", e)
             await asyncio.sleep(60)  # Wait 1 minute before retrying
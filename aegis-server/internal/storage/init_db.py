@@ -13,7 +13,7 @@ async def init_db():
         # Create system_metrics table
         await conn.execute('''
         CREATE TABLE IF NOT EXISTS system_metrics (
-            id BIGSERIAL PRIMARY KEY,
+            id BIGSERIAL,
             agent_id UUID NOT NULL REFERENCES devices(agent_id) ON DELETE CASCADE,
             timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
             cpu_data JSONB NOT NULL,
@@ -21,14 +21,70 @@ async def init_db():
             disk_data JSONB NOT NULL,
             network_data JSONB NOT NULL,
             process_data JSONB NOT NULL,
-            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            -- Composite primary key including partitioning column
+            PRIMARY KEY (id, timestamp)
         );
         ''')
         
-        # Create indexes for efficient querying
+        # Partition metrics into daily chunks when TimescaleDB is available,
+        # so window queries only touch the recent chunks and retention can
+        # drop whole chunks
         await conn.execute('''
-        CREATE INDEX IF NOT EXISTS idx_metrics_agent_time 
-        ON system_metrics(agent_id, timestamp DESC);
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb') THEN
+                PERFORM create_hypertable('system_metrics', 'timestamp',
+                    chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);
+            END IF;
+        EXCEPTION WHEN others THEN
+            -- Existing tables with data or the old primary key are converted
+            -- by scripts/migrations/convert_metrics_to_hypertable.sql
+            RAISE NOTICE 'system_metrics not converted to a hypertable: %', SQLERRM;
+        END
+        $$;
+        ''')
+        
+        # Typed copies of the readings that detection and export aggregate,
+        # so those scans don't parse and cast the JSONB payloads per row
+        await conn.execute('''
+        ALTER TABLE system_metrics
+            ADD COLUMN IF NOT EXISTS cpu_percent double precision
+                GENERATED ALWAYS AS ((cpu_data->>'cpu_percent')::float8) STORED,
+            ADD COLUMN IF NOT EXISTS memory_percent double precision
+                GENERATED ALWAYS AS ((memory_data->>'memory_percent')::float8) STORED,
+            ADD COLUMN IF NOT EXISTS disk_percent double precision
+                GENERATED ALWAYS AS (COALESCE(disk_data->>'disk_percent', disk_data->>'percent')::float8) STORED,
+            ADD COLUMN IF NOT EXISTS net_bytes_sent double precision
+                GENERATED ALWAYS AS (COALESCE(network_data->>'net_bytes_sent', network_data->>'bytes_sent')::float8) STORED,
+            ADD COLUMN IF NOT EXISTS net_bytes_recv double precision
+                GENERATED ALWAYS AS (COALESCE(network_data->>'net_bytes_recv', network_data->>'bytes_recv')::float8) STORED;
+        ''')
+        
+        # Create indexes for efficient querying. The per-agent time index
+        # carries the typed readings so window aggregations are index-only
+        await conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_metrics_agg 
+        ON system_metrics(agent_id, timestamp DESC)
+        INCLUDE (cpu_percent, memory_percent, disk_percent, net_bytes_sent, net_bytes_recv);
+        DROP INDEX IF EXISTS idx_metrics_agent_time;
+        ''')
+        
+        # Notify the ML detector which agents reported metrics, so it can
+        # skip detection cycles while none arrive
+        await conn.execute('''
+        CREATE OR REPLACE FUNCTION notify_new_metrics() RETURNS trigger AS $$
+        BEGIN
+            -- Identical notifications within a transaction are sent once
+            PERFORM pg_notify('new_metrics', NEW.agent_id::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_metrics_notify ON system_metrics;
+        CREATE TRIGGER trg_metrics_notify
+            AFTER INSERT ON system_metrics
+            FOR EACH ROW EXECUTE FUNCTION notify_new_metrics();
         ''')
         
         # Create metrics retention policy (optional)
@@ -77,15 +133,43 @@ async def init_db():
         CREATE INDEX IF NOT EXISTS idx_alerts_agent_time ON alerts(agent_id, created_at DESC);
         CREATE INDEX IF NOT EXISTS idx_alerts_incident ON alerts(incident_id);
         CREATE INDEX IF NOT EXISTS idx_alerts_severity ON alerts(severity);
+        CREATE INDEX IF NOT EXISTS idx_alerts_ungrouped ON alerts(created_at)
+            WHERE incident_id IS NULL;
         CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents(status);
         CREATE INDEX IF NOT EXISTS idx_incidents_severity ON incidents(severity);
         CREATE INDEX IF NOT EXISTS idx_incidents_created ON incidents(created_at DESC);
         ''')
         
+        # At most one ML alert per agent, rule and severity in each 30 minute
+        # bucket; the detector inserts with ON CONFLICT DO NOTHING against it
+        await conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_ml_dedup ON alerts(
+            agent_id, rule_name, severity,
+            (floor(extract(epoch FROM created_at AT TIME ZONE 'UTC') / 1800))
+        )
+        WHERE rule_name LIKE 'ML Anomaly Detection%';
+        ''')
+        
+        # Notify the incident aggregator when alerts are inserted so it can
+        # run early instead of waiting for its next polling interval
+        await conn.execute('''
+        CREATE OR REPLACE FUNCTION notify_new_alert() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('new_alert', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_alerts_notify ON alerts;
+        CREATE TRIGGER trg_alerts_notify
+            AFTER INSERT ON alerts
+            FOR EACH STATEMENT EXECUTE FUNCTION notify_new_alert();
+        ''')
+        
         # Create commands table for terminal command logging
         await conn.execute('''
         CREATE TABLE IF NOT EXISTS commands (
-            id BIGSERIAL PRIMARY KEY,
+            id BIGSERIAL,
             command TEXT NOT NULL,
             user_name VARCHAR(255) NOT NULL,
             timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
@@ -94,10 +178,29 @@ async def init_db():
             working_directory TEXT,
             exit_code INTEGER,
             agent_id UUID REFERENCES devices(agent_id) ON DELETE CASCADE,
-            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            -- Composite primary key including partitioning column
+            PRIMARY KEY (id, timestamp)
         );
         ''')
         
+        # Partition commands into weekly chunks when TimescaleDB is available,
+        # so retention drops whole chunks instead of deleting rows
+        await conn.execute('''
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb') THEN
+                PERFORM create_hypertable('commands', 'timestamp',
+                    chunk_time_interval => INTERVAL '7 days', if_not_exists => TRUE);
+            END IF;
+        EXCEPTION WHEN others THEN
+            -- Existing tables are converted by
+            -- scripts/migrations/convert_commands_logs_to_hypertables.sql
+            RAISE NOTICE 'commands not converted to a hypertable: %', SQLERRM;
+        END
+        $$;
+        ''')
+        
         # Create indexes for commands
         await conn.execute('''
         CREATE INDEX IF NOT EXISTS idx_commands_agent_time ON commands(agent_id, timestamp DESC);
@@ -1,13 +1,59 @@
 # aegis-server/internal/storage/postgres.py
 
 
+import asyncio
+
 import asyncpg
+import orjson
 
-from internal.config.config import DB_URL  # <--- IMPORT DB_URL
+from internal.config.config import DB_URL, settings  # <--- IMPORT DB_URL
 
 # We'll create a global pool variable
 db_pool: asyncpg.Pool = None
 
+# JSONB binary wire format: a version byte followed by the JSON text
+_JSONB_VERSION = b"\x01"
+
+
+def _encode_jsonb(value) -> bytes:
+    """
+    Encode a Python value for a JSONB parameter. Pre-serialized JSON strings
+    are passed through so existing json.dumps call sites keep working.
+    """
+    if isinstance(value, str):
+        return _JSONB_VERSION + value.encode()
+    if isinstance(value, bytes):
+        return _JSONB_VERSION + value
+    return _JSONB_VERSION + orjson.dumps(value)
+
+
+def _decode_jsonb(data: bytes):
+    """
+    Decode a JSONB value straight into Python objects.
+    """
+    return orjson.loads(data[1:])
+
+
+async def _init_connection(conn: asyncpg.Connection):
+    """
+    Per-connection setup: decode/encode JSONB with orjson so rows come back
+    with dicts instead of JSON text.
+    """
+    await conn.set_type_codec(
+        "jsonb",
+        encoder=_encode_jsonb,
+        decoder=_decode_jsonb,
+        schema="pg_catalog",
+        format="binary",
+    )
+
+async def _warm_connection(pool: asyncpg.Pool):
+    """
+    Run one round trip on a pooled connection.
+    """
+    async with pool.acquire() as conn:
+        await conn.fetchval("SELECT 1")
+
 async def init_db_pool():
     """
     Initializes the asyncpg connection pool.
@@ -20,9 +66,35 @@ async def init_db_pool():
     try:
         db_pool = await asyncpg.create_pool(
             DB_URL,
-            min_size=5,
-            max_size=20
+            # Ingest, the websocket feeds and the background ML/export tasks
+            # all draw from this pool. Sized per process from config.toml, as
+            # every uvicorn worker has its own pool; idle connections beyond
+            # min_size are closed again after ten minutes
+            min_size=settings.database.pool_min_size,
+            max_size=settings.database.pool_max_size,
+            max_inactive_connection_lifetime=600,
+            # asyncpg prepares every query it runs and reuses the plan on the
+            # same connection; a larger cache keeps the periodic export and
+            # analysis statements from being evicted by request traffic, and
+            # cached statements never expire by age
+            statement_cache_size=1024,
+            max_cached_statement_lifetime=0,
+            server_settings={
+                # Every query here is a short OLTP lookup or a bulk scan that
+                # is I/O bound; JIT compilation only adds planning latency
+                "jit": "off",
+                "application_name": "aegis-server",
+            },
+            init=_init_connection,
         )
+        # Awaiting create_pool already opened min_size connections. Holding
+        # them all at once makes each run a first query now, so the backend
+        # start-up cost and any broken connection surface at startup rather
+        # than on the first requests
+        await asyncio.gather(*[
+            _warm_connection(db_pool)
+            for _ in range(settings.database.pool_min_size)
+        ])
         print("Database connection pool established.")
     except Exception as e:
         print(f"Failed to create database pool: {e}")
@@ -49,6 +49,39 @@ async def run_daily_cleanup():
             await asyncio.sleep(3600)
 
 
+async def drop_old_chunks(conn, table: str, cutoff_date: datetime) -> int:
+    """
+    Drop a TimescaleDB hypertable's chunks that hold only rows older than
+    the cutoff. Whole chunks are dropped as files, without the per-row
+    index updates, WAL and vacuum work of a DELETE.
+    
+    Returns:
+        Number of chunks dropped (0 when the table is not a hypertable)
+    """
+    is_hypertable = await conn.fetchval(
+        """
+        SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'timescaledb')
+        """
+    ) and await conn.fetchval(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM timescaledb_information.hypertables
+            WHERE hypertable_name = $1
+        )
+        """,
+        table
+    )
+    if not is_hypertable:
+        return 0
+    
+    dropped = await conn.fetch(
+        "SELECT drop_chunks($1::regclass, older_than => $2::timestamptz)",
+        table,
+        cutoff_date
+    )
+    return len(dropped)
+
+
 async def perform_cleanup():
     """
     Perform the actual cleanup of old data.
@@ -62,22 +95,36 @@ async def perform_cleanup():
         # Calculate cutoff date (6 months ago)
         cutoff_date = datetime.now() - timedelta(days=180)
         
-        async with pool.acquire() as conn:
-            # Delete old commands
-            result_commands = await conn.execute(
-                "DELETE FROM commands WHERE timestamp < $1",
-                cutoff_date
-            )
-            commands_deleted = int(result_commands.split()[-1])
+        async with pool.acquire() as conn, conn.transaction():
+            # Drop whole chunks first on hypertables (commands and logs are
+            # converted by scripts/migrations); the DELETE below then only has
+            # the rows left in each table's boundary chunk. Both run in one
+            # transaction, so a failed cleanup leaves both tables untouched
+            chunks_dropped = {
+                table: await drop_old_chunks(conn, table, cutoff_date)
+                for table in ("commands", "logs")
+            }
             
-            # Delete old logs
-            result_logs = await conn.execute(
-                "DELETE FROM logs WHERE timestamp < $1",
+            # Delete remaining old commands and logs in one statement and round trip
+            commands_deleted, logs_deleted = await conn.fetchrow(
+                """
+                WITH deleted_commands AS (
+                    DELETE FROM commands WHERE timestamp < $1 RETURNING 1
+                ),
+                deleted_logs AS (
+                    DELETE FROM logs WHERE timestamp < $1 RETURNING 1
+                )
+                SELECT
+                    (SELECT count(*) FROM deleted_commands),
+                    (SELECT count(*) FROM deleted_logs)
+                """,
                 cutoff_date
             )
-            logs_deleted = int(result_logs.split()[-1])
             
             print(f"Retention cleanup results:")
+            for table, count in chunks_dropped.items():
+                if count:
+                    print(f"  - Dropped {count} {table} chunks older than {cutoff_date.date()}")
             print(f"  - Deleted {commands_deleted} commands older than {cutoff_date.date()}")
             print(f"  - Deleted {logs_deleted} logs older than {cutoff_date.date()}")
             
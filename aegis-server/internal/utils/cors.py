@@ -0,0 +1,93 @@
+"""CORS handling for the server's single allowed origin."""
+
+# Methods allowed on preflight, matching CORSMiddleware's allow_methods=["*"]
+_ALLOW_METHODS = b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+
+
+class CachedCORS:
+    """
+    ASGI middleware allowing credentialed requests from one origin.
+
+    Starlette's CORSMiddleware matches the origin against a list and rebuilds
+    its header lists on every request. With a single origin the headers never
+    change, so they are encoded once here and each request costs one bytes
+    comparison. Preflights get the same response CORSMiddleware gives with
+    allow_methods=["*"] and allow_headers=["*"].
+    """
+
+    def __init__(self, app, origin: str):
+        """
+        Args:
+            app: ASGI application to wrap
+            origin: The allowed origin, e.g. "http://localhost:5174"
+        """
+        self.app = app
+        self.origin = origin.encode("latin-1")
+        self.headers = [
+            (b"access-control-allow-origin", self.origin),
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+        ]
+        self.preflight_headers = [
+            *self.headers,
+            (b"access-control-allow-methods", _ALLOW_METHODS),
+            (b"access-control-max-age", b"600"),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        # Websockets and lifespan pass through, as with CORSMiddleware
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            await self.preflight(origin, request_headers, send)
+            return
+
+        if origin != self.origin:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + self.headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def preflight(self, origin: bytes, request_headers, send):
+        """Answer a CORS preflight request without reaching the app"""
+        if origin == self.origin:
+            status = 200
+            body = b"OK"
+            headers = list(self.preflight_headers)
+            if request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+        else:
+            status = 400
+            body = b"Disallowed CORS origin"
+            headers = [(b"vary", b"Origin")]
+
+        headers += [
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        await send(
+            {"type": "http.response.start", "status": status, "headers": headers}
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -1,20 +1,14 @@
 """JSON utilities for the server."""
 
-import json
-from datetime import date, datetime
-from uuid import UUID
+import orjson
 
 
-class AegisJSONEncoder(json.JSONEncoder):
-    """Custom JSON encoder that handles datetime, date, and UUID objects."""
-    def default(self, obj):
-        if isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        if isinstance(obj, UUID):
-            return str(obj)
-        # Let the base class handle everything else
-        return json.JSONEncoder.default(self, obj)
+def dumps(obj) -> str:
+    """
+    Dump object to a JSON string.
 
-def dumps(obj):
-    """Dump object to JSON string using our custom encoder."""
-    return json.dumps(obj, cls=AegisJSONEncoder)
\ No newline at end of file
+    orjson serializes datetime, date and UUID values natively in C, so no
+    Python-level default hook runs per object. Non-string keys are allowed,
+    matching the stdlib json behaviour this replaced.
+    """
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
@@ -0,0 +1,59 @@
+"""Non-blocking logging for the server."""
+
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that enqueues records as they are. The stock handler
+    formats the message before enqueueing, i.e. on the event loop; here the
+    listener thread does all formatting.
+    """
+    def prepare(self, record):
+        return record
+
+
+def start_queue_logging(level: int = logging.INFO):
+    """
+    Route records of the root logger through a queue to a listener thread
+    that formats and writes them to stdout, so logging from the event loop
+    never blocks on formatting or I/O.
+    """
+    global _listener, _queue_handler
+    if _listener:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(
+        logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    )
+
+    _queue_handler = _DeferredQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+
+def stop_queue_logging():
+    """
+    Flush the queued records and stop the listener thread.
+    """
+    global _listener, _queue_handler
+    if not _listener:
+        return
+
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    _listener = None
+    _queue_handler = None
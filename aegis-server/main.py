@@ -2,9 +2,10 @@
 
 import asyncio  # <--- IMPORT ASYNCIO
 from contextlib import asynccontextmanager
+from datetime import UTC, datetime, timedelta
 
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 # --- IMPORT THE ANALYSIS LOOP ---
 from internal.analysis.correlation import run_analysis_loop
@@ -13,6 +14,8 @@ from internal.ml.data_exporter import init_data_exporter, get_data_exporter
 from internal.ml.ml_detector import init_ml_service, run_ml_detection_loop
 from internal.storage.postgres import close_db_pool, init_db_pool
 from internal.utils.cleanup_task import run_daily_cleanup
+from internal.utils.cors import CachedCORS
+from internal.utils.log_queue import start_queue_logging, stop_queue_logging
 from routers import (
     agent_alerts,
     alerts,
@@ -33,14 +36,6 @@ from routers import (
     websocket,
 )
 
-# Store the background tasks so we can cancel them on shutdown
-background_task = None
-aggregation_task = None
-cleanup_task = None
-data_export_task = None
-ml_detection_task = None
-
-
 async def run_data_export_loop():
     """Background task to export data for ML training"""
     print("Starting data export loop for ML training...")
@@ -62,26 +57,11 @@ async def run_data_export_loop():
             print(f"Error in data export loop: {e}")
             await asyncio.sleep(60)  # Wait 1 minute before retrying
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    global background_task, aggregation_task, cleanup_task, data_export_task, ml_detection_task
-    print("Server starting up...")
-    await init_db_pool()
-    
-    # Initialize data exporter for ML training
-    from internal.storage.postgres import get_db_pool
-    pool = get_db_pool()
-    init_data_exporter(pool)
-    
-    # Initialize ML detection service
-    init_ml_service(pool)
-    
-    # Clean up old invitation tokens with invalid hash format
+async def cleanup_old_invitations(pool):
+    """Clean up old invitation tokens with invalid hash format"""
     try:
-        pool = get_db_pool()
         async with pool.acquire() as conn:
             # Delete invitations older than 7 days (likely have old hash format)
-            from datetime import datetime, timedelta, UTC
             week_ago = datetime.now(UTC) - timedelta(days=7)
             result = await conn.execute(
                 "DELETE FROM invitations WHERE expires_at < $1",
@@ -91,83 +71,87 @@ async def lifespan(app: FastAPI):
                 print(f"Cleaned up old invitation tokens: {result}")
     except Exception as e:
         print(f"Warning: Could not clean old invitations: {e}")
+
+def _background_task_done(task: asyncio.Task):
+    """Report a background task that stopped with an error"""
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Background task {task.get_name()} failed: {task.exception()!r}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print("Server starting up...")
+    start_queue_logging()
+    await init_db_pool()
+    
+    from internal.storage.postgres import get_db_pool
+    pool = get_db_pool()
+    
+    # Initialize the data exporter for ML training and the ML detection
+    # service together: the model loads in a worker thread while the
+    # exporter sets up its tracking table
+    ml_service = init_ml_service(pool)
+    await asyncio.gather(init_data_exporter(pool), ml_service.initialize())
     
     # --- START BACKGROUND TASKS ---
+    # Each loop runs as its own task, so one crashing doesn't stop the
+    # others; the set holds the only references until each task finishes
+    tasks: set[asyncio.Task] = set()
+    
+    def start_task(coro, name: str):
+        task = asyncio.create_task(coro, name=name)
+        tasks.add(task)
+        task.add_done_callback(_background_task_done)
+        task.add_done_callback(tasks.discard)
+    
+    # One-off; runs in the background so startup doesn't wait on it
+    start_task(cleanup_old_invitations(pool), "invitation-cleanup")
+    
     print("Starting background analysis task...")
-    background_task = asyncio.create_task(run_analysis_loop())
+    start_task(run_analysis_loop(), "analysis")
     
     print("Starting incident aggregation task...")
-    aggregation_task = asyncio.create_task(run_incident_aggregation_loop())
+    start_task(run_incident_aggregation_loop(), "incident-aggregation")
     
     print("Starting daily data retention cleanup task...")
-    cleanup_task = asyncio.create_task(run_daily_cleanup())
+    start_task(run_daily_cleanup(), "retention-cleanup")
     
     print("Starting data export task for ML training...")
-    data_export_task = asyncio.create_task(run_data_export_loop())
+    start_task(run_data_export_loop(), "data-export")
     
     print("Starting ML anomaly detection task...")
-    ml_detection_task = asyncio.create_task(run_ml_detection_loop())
-    
-    yield  # Application runs here
-    
-    # --- SHUTDOWN ---
-    print("Server shutting down...")
-    if background_task:
-        print("Stopping background analysis task...")
-        background_task.cancel()
-        try:
-            await background_task
-        except asyncio.CancelledError:
-            print("Background analysis task cancelled.")
-    
-    if aggregation_task:
-        print("Stopping incident aggregation task...")
-        aggregation_task.cancel()
-        try:
-            await aggregation_task
-        except asyncio.CancelledError:
-            print("Incident aggregation task cancelled.")
+    start_task(run_ml_detection_loop(), "ml-detection")
     
-    if cleanup_task:
-        print("Stopping cleanup task...")
-        cleanup_task.cancel()
-        try:
-            await cleanup_task
-        except asyncio.CancelledError:
-            print("Cleanup task cancelled.")
-    
-    if data_export_task:
-        print("Stopping data export task...")
-        data_export_task.cancel()
-        try:
-            await data_export_task
-        except asyncio.CancelledError:
-            print("Data export task cancelled")
-    
-    if ml_detection_task:
-        print("Stopping ML detection task...")
-        ml_detection_task.cancel()
-        try:
-            await ml_detection_task
-        except asyncio.CancelledError:
-            print("ML detection task cancelled")
-            
-    await close_db_pool()
+    try:
+        yield  # Application runs here
+    finally:
+        # --- SHUTDOWN ---
+        print("Server shutting down...")
+        # The loops only end when cancelled; cancel them all at once and
+        # wait for them together
+        print(f"Stopping {len(tasks)} background tasks...")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        print("Background tasks stopped.")
+        
+        exporter = get_data_exporter()
+        if exporter:
+            exporter.close()
+        
+        await close_db_pool()
+        stop_queue_logging()
 
 app = FastAPI(
     title="Aegis SIEM Server",
     description="The central API and ingestion server for Aegis SIEM.",
     version="0.1.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # Encode responses with orjson (already a dependency for the pool's
+    # JSONB codec) instead of stdlib json
+    default_response_class=ORJSONResponse
 )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5174"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app.add_middleware(CachedCORS, origin="http://localhost:5174")
 
 # --- Include Routers ---
 app.include_router(ingest.router, prefix="/api")
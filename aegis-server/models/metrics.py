@@ -1,26 +1,81 @@
 """Models for system metrics"""
 from datetime import datetime
-from typing import Any
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class _MetricsGroup(BaseModel):
+    """
+    One group of agent readings. Known readings are typed so they validate
+    without generic dict handling; anything else an agent sends is kept as is.
+    All readings are optional, as older agents report fewer of them.
+    """
+    model_config = ConfigDict(extra="allow", frozen=True)
+
+
+class CpuMetrics(_MetricsGroup):
+    """CPU usage percentage, count and load averages"""
+    cpu_percent: float | None = None
+    cpu_count: int | None = None
+    load_avg: list[float] | None = None
+
+
+class MemoryMetrics(_MetricsGroup):
+    """Memory and swap usage"""
+    memory_total: int | None = None
+    memory_available: int | None = None
+    memory_percent: float | None = None
+    swap_total: int | None = None
+    swap_used: int | None = None
+    swap_percent: float | None = None
+
+
+class DiskMetrics(_MetricsGroup):
+    """Root filesystem usage and disk I/O totals and rates (bytes/sec)"""
+    disk_total: int | None = None
+    disk_used: int | None = None
+    disk_free: int | None = None
+    disk_percent: float | None = None
+    disk_read_bytes: int | None = None
+    disk_write_bytes: int | None = None
+    disk_read_rate: int | None = None
+    disk_write_rate: int | None = None
+
+
+class NetworkMetrics(_MetricsGroup):
+    """Network I/O totals and rates (bytes/sec)"""
+    net_bytes_sent: int | None = None
+    net_bytes_recv: int | None = None
+    net_packets_sent: int | None = None
+    net_packets_recv: int | None = None
+    net_bytes_sent_rate: int | None = None
+    net_bytes_recv_rate: int | None = None
+
+
+class ProcessMetrics(_MetricsGroup):
+    """Process and thread counts"""
+    process_count: int | None = None
+    thread_count: int | None = None
 
 
 class SystemMetrics(BaseModel):
     """System metrics data model"""
+    model_config = ConfigDict(frozen=True)
+
     agent_id: str
     timestamp: datetime
-    cpu: dict[str, Any] = Field(
+    cpu: CpuMetrics = Field(
         description="CPU metrics including usage percentage and count"
     )
-    memory: dict[str, Any] = Field(
+    memory: MemoryMetrics = Field(
         description="Memory metrics including usage and swap"
     )
-    disk: dict[str, Any] = Field(
+    disk: DiskMetrics = Field(
         description="Disk metrics including usage and I/O"
     )
-    network: dict[str, Any] = Field(
+    network: NetworkMetrics = Field(
         description="Network metrics including bytes sent/received"
     )
-    process: dict[str, Any] = Field(
+    process: ProcessMetrics = Field(
         description="Process related metrics"
-    )
\ No newline at end of file
+    )
@@ -5,7 +5,7 @@ from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 
 from internal.auth.jwt import create_access_token  # <--- IMPORT
-from internal.auth.security import get_password_hash, verify_password
+from internal.auth.security import aget_password_hash, averify_password, needs_rehash
 from internal.storage.postgres import get_db_pool
 from models.models import Token, UserCreate, UserInDB
 
@@ -18,7 +18,7 @@ async def signup(
 ):
     # ... (This function remains unchanged) ...
     pool = get_db_pool()
-    hashed_pass = get_password_hash(user.password)
+    hashed_pass = await aget_password_hash(user.password)
     # Include default role as device_user
     sql = "INSERT INTO users (email, hashed_pass, role) VALUES ($1, $2, $3) RETURNING id, email, role, is_active"
     try:
@@ -81,18 +81,26 @@ async def login(
         )
 
     # 2. Verify the password
-    if not verify_password(password, db_user['hashed_pass']):
+    if not await averify_password(password, db_user['hashed_pass']):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, 
             detail="Incorrect email or password"
         )
 
-    # 3. Update last_login timestamp
+    # 3. Update last_login timestamp, upgrading the hash if its parameters are outdated
+    new_hash = None
+    if needs_rehash(db_user['hashed_pass']):
+        new_hash = await aget_password_hash(password)
     try:
         async with pool.acquire() as conn:
             await conn.execute(
-                "UPDATE users SET last_login = NOW() WHERE id = $1",
-                db_user['id']
+                """
+                UPDATE users
+                SET last_login = NOW(), hashed_pass = COALESCE($2, hashed_pass)
+                WHERE id = $1
+                """,
+                db_user['id'],
+                new_hash
             )
     except Exception:
         pass  # Non-critical failure
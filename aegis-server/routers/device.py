@@ -10,7 +10,7 @@ from internal.auth.jwt import get_current_user
 
 # --- MODIFICATION: Import verify_password and permissions ---
 from internal.auth.permissions import check_device_ownership
-from internal.auth.security import get_password_hash, verify_password
+from internal.auth.security import aget_password_hash, averify_password
 from internal.storage.postgres import get_db_pool
 from models.models import Device, DeviceRegister, Invitation, TokenData, UserInDB, UserRole
 
@@ -40,7 +40,7 @@ async def create_invitation(
     token = secrets.token_urlsafe(32)
     
     # 2. Hash the token for secure storage (just like a password)
-    token_hash = get_password_hash(token)
+    token_hash = await aget_password_hash(token)
     
     # 3. Set expiration (e.g., 1 hour from now)
     expires_at = datetime.now(UTC) + timedelta(hours=1)
@@ -94,7 +94,7 @@ async def register_device(
             for invite in invites:
                 # 2. Verify the token - returns False if hash is invalid
                 try:
-                    if verify_password(token, invite['token_hash']):
+                    if await averify_password(token, invite['token_hash']):
                         valid_invite = invite
                         break
                 except Exception as e:
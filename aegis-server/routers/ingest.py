@@ -7,6 +7,7 @@ import uuid
 import asyncpg
 from fastapi import APIRouter, Header, HTTPException, Request
 
+from internal.ml.data_exporter import get_data_exporter
 from internal.storage.postgres import get_db_pool
 from models.models import LogEntry
 
@@ -105,15 +106,21 @@ async def ingest_logs(
             """
             
             # Use a transaction for better performance
+            inserted = 0
             async with conn.transaction():
                 for record in records_to_insert:
                     try:
                         await conn.execute(sql, *record)
+                        inserted += 1
                     except Exception as e:
                         # Skip problematic records but continue processing
                         print(f"Warning: Skipped log entry due to error: {e}")
                         continue
             
+            exporter = get_data_exporter()
+            if exporter:
+                exporter.note_inserted("logs", inserted)
+            
     except asyncpg.exceptions.PostgresError as e:
         print(f"Database error during log ingestion: {e}")
         raise HTTPException(status_code=500, detail=f"Database insertion error: {e}")
@@ -3,13 +3,14 @@ Router for system metrics endpoints.
 Handles metrics ingestion and querying.
 """
 
-import json
 import uuid
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from pydantic import TypeAdapter
 
 from internal.auth.jwt import get_current_user
+from internal.ml.data_exporter import get_data_exporter
 from internal.storage.postgres import get_db_pool
 from models.metrics import SystemMetrics
 from models.models import TokenData
@@ -17,6 +18,9 @@ from routers.websocket import push_update_to_user
 
 router = APIRouter()
 
+# Serializes metric lists straight to JSON bytes in pydantic-core
+_metrics_list = TypeAdapter(list[SystemMetrics])
+
 @router.post("/metrics")
 async def ingest_metrics(
     metrics: SystemMetrics,
@@ -48,12 +52,8 @@ async def ingest_metrics(
                 x_aegis_agent_id
             )
             
-            # Convert model fields to JSON strings for JSONB columns
-            cpu_json = json.dumps(dict(metrics.cpu))
-            memory_json = json.dumps(dict(metrics.memory))
-            disk_json = json.dumps(dict(metrics.disk))
-            network_json = json.dumps(dict(metrics.network))
-            process_json = json.dumps(dict(metrics.process))
+            # JSONB columns are encoded by the pool codec, so pass plain dicts.
+            # Only the readings the agent sent are stored, not unset fields
 
             # Store metrics
             await conn.execute(
@@ -65,15 +65,19 @@ async def ingest_metrics(
                 """,
                 str(x_aegis_agent_id),
                 metrics.timestamp,
-                cpu_json,
-                memory_json,
-                disk_json,
-                network_json,
-                process_json
+                metrics.cpu.model_dump(exclude_unset=True),
+                metrics.memory.model_dump(exclude_unset=True),
+                metrics.disk.model_dump(exclude_unset=True),
+                metrics.network.model_dump(exclude_unset=True),
+                metrics.process.model_dump(exclude_unset=True)
             )
 
+            exporter = get_data_exporter()
+            if exporter:
+                exporter.note_inserted("metrics")
+
             # Push real-time update
-            metrics_dict = metrics.dict()
+            metrics_dict = metrics.model_dump(exclude_unset=True)
             metrics_dict["timestamp"] = metrics.timestamp.isoformat()
             await push_update_to_user(user_id, {
                 "type": "device_metrics",
@@ -153,11 +157,11 @@ async def get_metrics(
                 SELECT 
                     agent_id,
                     timestamp,
-                    cpu_data::text as cpu_data,
-                    memory_data::text as memory_data,
-                    disk_data::text as disk_data,
-                    network_data::text as network_data,
-                    process_data::text as process_data
+                    cpu_data,
+                    memory_data,
+                    disk_data,
+                    network_data,
+                    process_data
                 FROM system_metrics 
                 WHERE agent_id = $1 
                 AND timestamp > $2
@@ -167,25 +171,30 @@ async def get_metrics(
             datetime.now() - time_delta
             )
             
-            # Convert JSONB text to Python dicts
+            # JSONB columns arrive as dicts from the pool codec
             metrics = []
             for row in rows:
                 try:
                     metric = SystemMetrics(
                         agent_id=str(row['agent_id']),
                         timestamp=row['timestamp'],
-                        cpu=json.loads(row['cpu_data']),
-                        memory=json.loads(row['memory_data']),
-                        disk=json.loads(row['disk_data']),
-                        network=json.loads(row['network_data']),
-                        process=json.loads(row['process_data'])
+                        cpu=row['cpu_data'],
+                        memory=row['memory_data'],
+                        disk=row['disk_data'],
+                        network=row['network_data'],
+                        process=row['process_data']
                     )
                     metrics.append(metric)
                 except Exception as e:
                     print(f"Error processing metric row: {e}")
                     continue
             
-            return metrics
+            # Serialize in pydantic-core instead of FastAPI's jsonable_encoder
+            # pass, leaving out readings the rows didn't have
+            return Response(
+                content=_metrics_list.dump_json(metrics, exclude_unset=True),
+                media_type="application/json"
+            )
             
     except Exception as e:
         raise HTTPException(
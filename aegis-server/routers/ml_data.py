@@ -12,6 +12,8 @@ Author: Mokshit Bindal
 Date: November 13, 2025
 """
 
+import asyncio
+import contextlib
 import os
 from datetime import datetime
 from pathlib import Path
@@ -24,7 +26,7 @@ from fastapi.responses import FileResponse
 from pydantic import BaseModel
 
 from internal.auth.jwt import get_current_user
-from internal.ml.data_exporter import get_data_exporter
+from internal.ml.data_exporter import DATA_TYPES, get_data_exporter
 from models.models import TokenData, UserRole
 
 router = APIRouter(prefix="/api/ml-data", tags=["ml-data"])
@@ -89,48 +91,28 @@ async def get_export_status(
     
     # Count total exported rows across all files
     total_exports = 0
-    for file_type in ['logs', 'metrics', 'processes', 'commands']:
-        csv_file = exporter.export_dir / f"{file_type}.csv"
-        if csv_file.exists():
-            try:
-                import subprocess
-                row_count = int(subprocess.check_output(['wc', '-l', str(csv_file)]).split()[0]) - 1
-                total_exports += row_count
-            except:
-                pass
+    for file_type in DATA_TYPES:
+        with contextlib.suppress(Exception):
+            total_exports += _exported_row_count(exporter, file_type)
     
     # Count unexported data (new data since last export)
     from internal.storage.postgres import get_db_pool
     pool = get_db_pool()
-    unexported_logs = 0
-    unexported_metrics = 0
-    unexported_processes = 0
-    unexported_commands = 0
+    unexported = dict.fromkeys(DATA_TYPES, 0)
     
     try:
         async with pool.acquire() as conn:
-            # Count logs (total in DB)
-            total_logs = await conn.fetchval("SELECT COUNT(*) FROM logs")
-            # Calculate new logs since last export
-            unexported_logs = max(0, total_logs - exporter.last_export_counts['logs'])
-            
-            # Count metrics (total in DB)
-            total_metrics = await conn.fetchval("SELECT COUNT(*) FROM system_metrics")
-            unexported_metrics = max(0, total_metrics - exporter.last_export_counts['metrics'])
-            
-            # Count processes from history table (all snapshots for ML)
-            try:
-                total_processes = await conn.fetchval("SELECT COUNT(*) FROM processes_history")
-                unexported_processes = max(0, total_processes - exporter.last_export_counts['processes'])
-            except asyncpg.exceptions.UndefinedTableError:
-                unexported_processes = 0
-            
-            # Count commands (total in DB)
-            try:
-                total_commands = await conn.fetchval("SELECT COUNT(*) FROM commands")
-                unexported_commands = max(0, total_commands - exporter.last_export_counts['commands'])
-            except asyncpg.exceptions.UndefinedTableError:
-                unexported_commands = 0
+            for data_type in DATA_TYPES:
+                # Logs and metrics are tracked in memory by the ingest routes;
+                # count them in the database when those counters are stale or
+                # not kept (several workers)
+                count = exporter.tracked_new_rows(data_type)
+                if count is None:
+                    try:
+                        count = await exporter.count_new_rows(conn, data_type)
+                    except asyncpg.exceptions.UndefinedTableError:
+                        count = 0
+                unexported[data_type] = count
     except Exception as e:
         print(f"Error counting unexported data: {e}")
     
@@ -143,10 +125,10 @@ async def get_export_status(
         last_export_counts=exporter.last_export_counts,
         total_exports=total_exports,
         last_export_time=exporter.last_export_time.isoformat() if exporter.last_export_time else None,
-        unexported_logs=unexported_logs,
-        unexported_metrics=unexported_metrics,
-        unexported_processes=unexported_processes,
-        unexported_commands=unexported_commands
+        unexported_logs=unexported["logs"],
+        unexported_metrics=unexported["metrics"],
+        unexported_processes=unexported["processes"],
+        unexported_commands=unexported["commands"]
     )
 
 
@@ -302,24 +284,24 @@ async def list_exports(
     
     exports = []
     
-    # List the four main export files
+    # List the four main exports
     for file_type in ['logs', 'metrics', 'processes', 'commands']:
-        csv_file = exporter.export_dir / f"{file_type}.csv"
-        if csv_file.exists():
-            # Get file stats
-            file_size = csv_file.stat().st_size
-            modified_time = datetime.fromtimestamp(csv_file.stat().st_mtime)
+        export_files = exporter.export_files(file_type)
+        if export_files:
+            # Get file stats (a Parquet export is a directory of part files)
+            stats = [f.stat() for f in export_files]
+            file_size = sum(st.st_size for st in stats)
+            modified_time = datetime.fromtimestamp(max(st.st_mtime for st in stats))
             
             # Count rows (excluding header)
             try:
-                import subprocess
-                row_count = int(subprocess.check_output(['wc', '-l', str(csv_file)]).split()[0]) - 1
+                row_count = _exported_row_count(exporter, file_type)
             except:
                 row_count = "unknown"
             
             exports.append({
                 "type": file_type,
-                "filename": f"{file_type}.csv",
+                "filename": exporter.export_path(file_type).name,
                 "size_bytes": file_size,
                 "size_mb": round(file_size / 1024 / 1024, 2),
                 "row_count": row_count,
@@ -331,14 +313,14 @@ async def list_exports(
     if labeled_dir.exists():
         for label_dir in sorted(labeled_dir.glob("*"), reverse=True):
             if label_dir.is_dir():
-                for csv_file in label_dir.glob("*.csv"):
-                    file_size = csv_file.stat().st_size
-                    modified_time = datetime.fromtimestamp(csv_file.stat().st_mtime)
+                for data_file in [*label_dir.glob("*.csv"), *label_dir.glob("*.parquet")]:
+                    file_size = data_file.stat().st_size
+                    modified_time = datetime.fromtimestamp(data_file.stat().st_mtime)
                     
                     exports.append({
                         "type": "labeled",
                         "label": label_dir.name,
-                        "filename": csv_file.name,
+                        "filename": data_file.name,
                         "size_bytes": file_size,
                         "size_mb": round(file_size / 1024 / 1024, 2),
                         "last_modified": modified_time.isoformat(),
@@ -392,68 +374,77 @@ async def download_export_file(
         )
     
     # Find the file
-    csv_file = exporter.export_dir / f"{file_type}.csv"
-    if not csv_file.exists():
+    if not exporter.export_files(file_type):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Export file '{file_type}.csv' not found. No data exported yet."
+            detail=f"Export '{exporter.export_path(file_type).name}' not found. No data exported yet."
         )
     
-    # If no filters, return the whole file
-    if not start_date and not end_date and not agent_id:
+    # Generate filename with filter info
+    filename_parts = [file_type]
+    if agent_id:
+        filename_parts.append(f"agent_{agent_id[:8]}")
+    if start_date:
+        filename_parts.append(f"from_{start_date[:10]}")
+    if end_date:
+        filename_parts.append(f"to_{end_date[:10]}")
+    filename = "_".join(filename_parts) + ".csv"
+    
+    # An unfiltered CSV export is served as is
+    if exporter.format == "csv" and not start_date and not end_date and not agent_id:
         return FileResponse(
-            path=str(csv_file),
+            path=str(exporter.export_path(file_type)),
             media_type="text/csv",
             filename=f"{file_type}_export.csv"
         )
     
-    # Apply filters using pandas
+    return await _download_filtered_export(exporter, file_type, filename, start_date, end_date, agent_id)
+
+
+def _exported_row_count(exporter, file_type: str) -> int:
+    """Count exported rows: Parquet footers, or lines of the legacy CSV"""
+    if exporter.format != "csv":
+        return exporter.exported_row_count(file_type)
+    
+    import subprocess
+    csv_file = exporter.export_path(file_type)
+    return int(subprocess.check_output(['wc', '-l', str(csv_file)]).split()[0]) - 1
+
+
+async def _download_filtered_export(
+    exporter,
+    file_type: str,
+    filename: str,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    agent_id: Optional[str],
+):
+    """
+    Serve the rows of an export matching the filters as CSV. Reading,
+    filtering and CSV writing all run in Arrow's C++ code (filters are
+    pushed down into Parquet scans), in a worker thread.
+    """
     try:
-        import pandas as pd
-        import io
-        
-        # Read the CSV file
-        df = pd.read_csv(csv_file)
+        import pyarrow.csv as pa_csv
+        from tempfile import NamedTemporaryFile
         
-        # Apply agent filter
-        if agent_id:
-            df = df[df['agent_id'] == agent_id]
+        start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00')) if start_date else None
+        end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00')) if end_date else None
         
-        # Apply date filters
-        timestamp_col = 'timestamp' if 'timestamp' in df.columns else 'collected_at'
-        if timestamp_col in df.columns:
-            df[timestamp_col] = pd.to_datetime(df[timestamp_col])
-            
-            if start_date:
-                start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                df = df[df[timestamp_col] >= start_dt]
-            
-            if end_date:
-                end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                df = df[df[timestamp_col] <= end_dt]
+        table = await asyncio.to_thread(
+            exporter.read_export, file_type, agent_id=agent_id, start_time=start_dt, end_time=end_dt
+        )
         
         # Check if any data remains after filtering
-        if df.empty:
+        if table.num_rows == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No data found matching the specified filters"
             )
         
-        # Create temporary file with filtered data
-        from tempfile import NamedTemporaryFile
-        temp_file = NamedTemporaryFile(mode='w', delete=False, suffix='.csv')
-        df.to_csv(temp_file.name, index=False)
+        temp_file = NamedTemporaryFile(mode='wb', delete=False, suffix='.csv')
         temp_file.close()
-        
-        # Generate filename with filter info
-        filename_parts = [file_type]
-        if agent_id:
-            filename_parts.append(f"agent_{agent_id[:8]}")
-        if start_date:
-            filename_parts.append(f"from_{start_date[:10]}")
-        if end_date:
-            filename_parts.append(f"to_{end_date[:10]}")
-        filename = "_".join(filename_parts) + ".csv"
+        await asyncio.to_thread(pa_csv.write_csv, table, temp_file.name)
         
         return FileResponse(
             path=temp_file.name,
@@ -461,7 +452,9 @@ async def download_export_file(
             filename=filename,
             background=None  # Keep file until download completes
         )
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error filtering export file: {e}")
         raise HTTPException(
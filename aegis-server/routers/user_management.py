@@ -6,7 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 
 from internal.auth.jwt import get_current_user
 from internal.auth.permissions import can_create_user, can_modify_user
-from internal.auth.security import get_password_hash
+from internal.auth.security import aget_password_hash
 from internal.storage.postgres import get_db_pool
 from models.models import (
     TokenData,
@@ -50,7 +50,7 @@ async def create_user(
         )
     
     pool = get_db_pool()
-    hashed_pass = get_password_hash(user_data.password)
+    hashed_pass = await aget_password_hash(user_data.password)
     
     try:
         async with pool.acquire() as conn:
@@ -36,7 +36,7 @@ async def websocket_endpoint(
         try:
             # We have to manually implement auth dependency logic here
             # (This is a simplified version for brevity)
-            from internal.auth.jwt import JWTError, jwt, settings
+            from internal.auth.jwt import InvalidTokenError, jwt, settings
             from internal.storage.postgres import get_db_pool
 
             from .device import get_user_by_email
@@ -48,14 +48,14 @@ async def websocket_endpoint(
             )
             email: str = payload.get("sub")
             if email is None:
-                raise JWTError()
+                raise InvalidTokenError()
 
             # 3. Find the user
             pool = get_db_pool()
             async with pool.acquire() as conn:
                 user = await get_user_by_email(email, conn)
                 if not user:
-                    raise JWTError()
+                    raise InvalidTokenError()
                 user_id = user.id
 
         except Exception:
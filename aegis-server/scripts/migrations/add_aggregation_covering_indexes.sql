@@ -0,0 +1,24 @@
+-- Migration: Add covering indexes for the detection aggregation windows
+-- Date: 2026-10-16
+-- Description: The anomaly detector aggregates system_metrics and processes
+-- per agent over a time window every cycle. Carrying the aggregated columns in
+-- the (agent_id, time) index lets those scans run as index-only scans instead
+-- of fetching the wide JSONB rows from the heap. Requires the generated
+-- columns from add_metrics_generated_columns.sql. Each covering index
+-- replaces the plain (agent_id, time) index it extends.
+
+-- CONCURRENTLY avoids locking system_metrics against ingest; run outside a transaction
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_metrics_agg
+ON system_metrics(agent_id, timestamp DESC)
+INCLUDE (cpu_percent, memory_percent, disk_percent, net_bytes_sent, net_bytes_recv);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_metrics_agent_time;
+
+-- processes is a hypertable, which does not support CONCURRENTLY; building
+-- one chunk per transaction keeps each lock short instead
+CREATE INDEX IF NOT EXISTS idx_processes_agg
+ON processes(agent_id, collected_at DESC)
+INCLUDE (name, cpu_percent, memory_percent)
+WITH (timescaledb.transaction_per_chunk);
+
+DROP INDEX IF EXISTS idx_processes_agent_collected;
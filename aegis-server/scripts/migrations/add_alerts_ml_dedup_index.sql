@@ -0,0 +1,16 @@
+-- Migration: Add unique dedup index for ML alerts
+-- Date: 2026-10-16
+-- Description: The ML detector suppressed repeated alerts with a SELECT before
+-- every INSERT, which costs a round trip and races with concurrent inserts.
+-- This unique index allows one alert per agent, rule and severity in each
+-- 30 minute bucket, and the detector inserts with ON CONFLICT DO NOTHING.
+-- created_at is converted to UTC first so the expression is immutable.
+
+-- Earlier ML alerts were at least 30 minutes apart, so existing rows don't
+-- collide. CONCURRENTLY avoids locking alerts; run outside a transaction
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_ml_dedup
+ON alerts(
+    agent_id, rule_name, severity,
+    (floor(extract(epoch FROM created_at AT TIME ZONE 'UTC') / 1800))
+)
+WHERE rule_name LIKE 'ML Anomaly Detection%';
@@ -0,0 +1,17 @@
+-- Migration: Notify on alert inserts
+-- Date: 2026-10-16
+-- Description: The incident aggregator LISTENs on the new_alert channel so it
+-- can run as soon as alerts arrive instead of polling on a fixed interval.
+-- A statement-level trigger sends one notification per INSERT statement.
+
+CREATE OR REPLACE FUNCTION notify_new_alert() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('new_alert', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_alerts_notify ON alerts;
+CREATE TRIGGER trg_alerts_notify
+    AFTER INSERT ON alerts
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_new_alert();
@@ -0,0 +1,10 @@
+-- Migration: Add partial index for ungrouped alerts
+-- Date: 2026-10-16
+-- Description: The incident aggregator polls alerts with incident_id IS NULL
+-- every cycle. A partial index keeps that scan on the small open set instead
+-- of the full alerts table.
+
+-- CONCURRENTLY avoids locking alerts against ingest; run outside a transaction
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_alerts_ungrouped
+ON alerts(created_at)
+WHERE incident_id IS NULL;
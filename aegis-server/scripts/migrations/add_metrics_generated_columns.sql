@@ -0,0 +1,20 @@
+-- Migration: Add typed generated columns to system_metrics
+-- Date: 2026-10-16
+-- Description: The anomaly detector and the ML exporter aggregate the cpu,
+-- memory, disk and network readings of system_metrics on every cycle. Reading
+-- them out of the JSONB payloads parses and casts each row again; STORED
+-- generated columns keep them as native double precision values computed once
+-- at insert time.
+
+-- Adding a STORED column rewrites system_metrics; run during a quiet period
+ALTER TABLE system_metrics
+    ADD COLUMN IF NOT EXISTS cpu_percent double precision
+        GENERATED ALWAYS AS ((cpu_data->>'cpu_percent')::float8) STORED,
+    ADD COLUMN IF NOT EXISTS memory_percent double precision
+        GENERATED ALWAYS AS ((memory_data->>'memory_percent')::float8) STORED,
+    ADD COLUMN IF NOT EXISTS disk_percent double precision
+        GENERATED ALWAYS AS (COALESCE(disk_data->>'disk_percent', disk_data->>'percent')::float8) STORED,
+    ADD COLUMN IF NOT EXISTS net_bytes_sent double precision
+        GENERATED ALWAYS AS (COALESCE(network_data->>'net_bytes_sent', network_data->>'bytes_sent')::float8) STORED,
+    ADD COLUMN IF NOT EXISTS net_bytes_recv double precision
+        GENERATED ALWAYS AS (COALESCE(network_data->>'net_bytes_recv', network_data->>'bytes_recv')::float8) STORED;
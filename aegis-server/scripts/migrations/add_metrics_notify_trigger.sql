@@ -0,0 +1,20 @@
+-- Migration: Notify on system_metrics inserts
+-- Date: 2026-10-16
+-- Description: The ML detection loop LISTENs on the new_metrics channel so it
+-- only runs detection cycles for agents that reported metrics since the last
+-- cycle, and none at all while no metrics arrive. A statement-level trigger
+-- sends one notification per distinct agent in each INSERT statement.
+
+CREATE OR REPLACE FUNCTION notify_new_metrics() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('new_metrics', agent_id::text)
+    FROM (SELECT DISTINCT agent_id FROM inserted_metrics) AS agents;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_metrics_notify ON system_metrics;
+CREATE TRIGGER trg_metrics_notify
+    AFTER INSERT ON system_metrics
+    REFERENCING NEW TABLE AS inserted_metrics
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_new_metrics();
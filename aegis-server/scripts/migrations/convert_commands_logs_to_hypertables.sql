@@ -0,0 +1,37 @@
+-- Migration: Convert commands and logs to TimescaleDB hypertables
+-- Date: 2026-10-16
+-- Description: The daily retention cleanup removes commands and logs older
+-- than 180 days. On plain tables that is a row-by-row DELETE over millions of
+-- rows, with index maintenance, WAL and vacuum afterwards. As hypertables with
+-- weekly chunks, the cleanup drops whole expired chunks with drop_chunks and
+-- only deletes the few old rows left in the boundary chunk.
+
+DO $$
+DECLARE
+    tbl text;
+    pkey_name text;
+    pkey_cols text;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['commands', 'logs'] LOOP
+        -- Hypertable unique keys must include the partitioning column
+        SELECT c.conname, string_agg(quote_ident(a.attname), ', ' ORDER BY k.ord)
+        INTO pkey_name, pkey_cols
+        FROM pg_constraint c
+        CROSS JOIN LATERAL unnest(c.conkey) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+        WHERE c.conrelid = tbl::regclass AND c.contype = 'p'
+        GROUP BY c.conname;
+
+        IF pkey_name IS NOT NULL AND pkey_cols NOT LIKE '%timestamp%' THEN
+            EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', tbl, pkey_name);
+            EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (%s, timestamp)', tbl, pkey_cols);
+        END IF;
+
+        -- Moves the existing rows into chunks; locks the table while it runs
+        PERFORM create_hypertable(tbl::regclass, 'timestamp',
+            chunk_time_interval => INTERVAL '7 days',
+            migrate_data => TRUE,
+            if_not_exists => TRUE);
+    END LOOP;
+END
+$$;
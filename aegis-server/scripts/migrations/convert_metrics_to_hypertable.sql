@@ -0,0 +1,33 @@
+-- Migration: Convert system_metrics to a TimescaleDB hypertable
+-- Date: 2026-10-16
+-- Description: The ML detector and exporter only read recent time windows of
+-- system_metrics, but the table is one heap that grows with every agent
+-- report. As a hypertable with daily chunks, like logs and processes, window
+-- queries only touch the recent chunks and retention can drop whole chunks.
+-- The JSONB payloads stay, because the metrics API returns them; the typed
+-- generated columns from add_metrics_generated_columns.sql cover the
+-- aggregations.
+
+-- Hypertable unique keys must include the partitioning column
+ALTER TABLE system_metrics DROP CONSTRAINT IF EXISTS system_metrics_pkey;
+ALTER TABLE system_metrics ADD PRIMARY KEY (id, timestamp);
+
+-- Hypertables don't support transition tables, so notify per row instead;
+-- identical notifications within a transaction are still sent once
+CREATE OR REPLACE FUNCTION notify_new_metrics() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('new_metrics', NEW.agent_id::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_metrics_notify ON system_metrics;
+CREATE TRIGGER trg_metrics_notify
+    AFTER INSERT ON system_metrics
+    FOR EACH ROW EXECUTE FUNCTION notify_new_metrics();
+
+-- Moves the existing rows into chunks; locks the table while it runs
+SELECT create_hypertable('system_metrics', 'timestamp',
+    chunk_time_interval => INTERVAL '1 day',
+    migrate_data => TRUE,
+    if_not_exists => TRUE);
@@ -223,6 +223,9 @@ password = "$DB_PASSWORD"
 database = "$DB_NAME"
 host = "localhost"
 port = 5432
+# Per worker: 4 workers x 20 stays below PostgreSQL's default 100 connections
+pool_min_size = 5
+pool_max_size = 20
 
 [jwt]
 secret_key = "$JWT_SECRET"
@@ -274,7 +277,7 @@ User=$AEGIS_USER
 Group=$AEGIS_GROUP
 WorkingDirectory=$SERVER_DIR
 Environment="PATH=$SERVER_DIR/venv/bin"
-ExecStart=$SERVER_DIR/venv/bin/uvicorn main:app --host 0.0.0.0 --port $SERVER_PORT --workers 4
+ExecStart=$SERVER_DIR/venv/bin/uvicorn main:app --host 0.0.0.0 --port $SERVER_PORT --workers 4 --loop uvloop --http httptools
 Restart=always
 RestartSec=10
 StandardOutput=append:$LOG_DIR/server.log